@@ -1,17 +1,19 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
 import numpy as np
-from arcgis.gis import GIS
-from arcgis.features import FeatureLayer, FeatureLayerCollection
 import zipfile
 import tempfile
 import os
+import io
+import hashlib
 import shutil
 from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
-import folium
-from streamlit_folium import st_folium
+import orjson
+from utils.geometry import sdf_to_geodataframe
+from utils.portal import search_user_items, wait_for_item_indexed, query_feature_pages
 # import fiona  # Removed due to system dependency issues
 import warnings
 warnings.filterwarnings('ignore')
@@ -24,6 +26,24 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Sharing levels offered when publishing
+SHARING_LEVELS = ("private", "org", "public")
+
+# Rows per page when previewing an uploaded shapefile
+PREVIEW_PAGE_SIZE = 50
+
+@st.cache_resource(show_spinner=False)
+def credential_salt():
+    """Random per-process key for credential digests, so cache keys can't be recomputed from a known password"""
+    return os.urandom(16)
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def connect_gis(portal_url, username, credential_digest, _password):
+    """Sign in once per credential set; later logins (e.g. after a browser refresh) reuse the connection"""
+    from arcgis.gis import GIS
+
+    return GIS(portal_url, username, _password)
+
 def authenticate():
     """Handle ArcGIS Online authentication"""
     if 'authenticated' not in st.session_state:
@@ -42,11 +62,17 @@ def authenticate():
             if username and password:
                 try:
                     with st.spinner("Authenticating..."):
-                        gis = GIS("https://www.arcgis.com", username, password)
+                        credential_digest = hashlib.blake2b(
+                            f"{username}\0{password}".encode(), key=credential_salt(), digest_size=16
+                        ).hexdigest()
+                        gis = connect_gis("https://www.arcgis.com", username, credential_digest, password)
+                        user = gis.users.me
                         st.session_state.gis = gis
                         st.session_state.authenticated = True
-                        st.session_state.username = username
-                        st.success(f"Successfully authenticated as {gis.users.me.username}")
+                        st.session_state.username = user.username
+                        st.session_state.user_role = user.role
+                        st.session_state.connection_key = ("https://www.arcgis.com", username, credential_digest)
+                        st.success(f"Successfully authenticated as {user.username}")
                         st.rerun()
                 except Exception as e:
                     st.error(f"Authentication failed: {str(e)}")
@@ -60,12 +86,7 @@ def authenticate():
 def get_feature_layers(username):
     """Get user's existing feature layers"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + username,
-            item_type="Feature Service",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(username, "Feature Service", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving layers: {str(e)}")
         return []
@@ -73,42 +94,49 @@ def get_feature_layers(username):
 def get_web_maps(username):
     """Get user's existing web maps"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + username,
-            item_type="Web Map",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(username, "Web Map", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving web maps: {str(e)}")
         return []
 
-def get_layer_preview_data(layer_id, max_features=10):
+@st.cache_resource(ttl=300, show_spinner=False)
+def get_layer_collection(item_id, username, _item):
+    """Load a feature service's layer collection once per item and user; the handle carries that user's GIS connection"""
+    from arcgis.features import FeatureLayerCollection
+
+    return FeatureLayerCollection.fromitem(_item)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def query_layer_preview(layer_id, max_features, username, _layer_item):
+    """Query a few features and the layer summary once a minute per layer and user, not on every map rerun"""
+    feature_layer = get_layer_collection(layer_id, username, _layer_item).layers[0]
+    
+    # Query limited features
+    feature_set = feature_layer.query(out_fields="*", result_record_count=max_features)
+    if not feature_set.features:
+        return None, None
+    
+    # Convert to a GeoDataFrame once; map reruns reuse the parsed geometries
+    df = feature_set.sdf
+    if 'SHAPE' in df.columns:
+        df = sdf_to_geodataframe(df)
+    
+    # Get layer info
+    layer_info = {
+        'title': _layer_item.title,
+        'feature_count': feature_layer.query(return_count_only=True),
+        'geometry_type': feature_layer.properties.geometryType,
+        'fields': [field['name'] for field in feature_layer.properties.fields]
+    }
+    
+    return df, layer_info
+
+def get_layer_preview_data(layer_id, max_features=10, layer_item=None):
     """Get preview data for a layer"""
     try:
-        layer_item = st.session_state.gis.content.get(layer_id)
-        layer_collection = FeatureLayerCollection.fromitem(layer_item)
-        feature_layer = layer_collection.layers[0]
-        
-        # Query limited features
-        feature_set = feature_layer.query(return_count_only=False, result_record_count=max_features)
-        
-        if feature_set.features:
-            # Convert to DataFrame
-            df = feature_set.sdf
-            
-            # Get layer info
-            layer_info = {
-                'title': layer_item.title,
-                'feature_count': feature_layer.query(return_count_only=True),
-                'geometry_type': feature_layer.properties.geometryType,
-                'fields': [field['name'] for field in feature_layer.properties.fields]
-            }
-            
-            return df, layer_info
-        else:
-            return None, None
-            
+        if layer_item is None:
+            layer_item = st.session_state.gis.content.get(layer_id)
+        return query_layer_preview(layer_id, max_features, st.session_state.username, layer_item)
     except Exception as e:
         st.error(f"Error loading layer preview: {str(e)}")
         return None, None
@@ -123,7 +151,7 @@ def validate_layer_compatibility(layers):
         for layer in layers:
             layer_collection = None
             try:
-                layer_collection = FeatureLayerCollection.fromitem(layer)
+                layer_collection = get_layer_collection(layer.id, st.session_state.username, layer)
                 feature_layer = layer_collection.layers[0]
                 geometry_types.add(feature_layer.properties.geometryType)
                 
@@ -147,6 +175,9 @@ def validate_layer_compatibility(layers):
 
 def create_layer_map(df, layer_title):
     """Create a folium map for layer preview"""
+    import geopandas as gpd
+    import folium
+
     try:
         if df is None or len(df) == 0:
             return None
@@ -155,8 +186,11 @@ def create_layer_map(df, layer_title):
         if 'SHAPE' not in df.columns:
             return None
             
-        # Convert to GeoDataFrame
-        gdf = df.set_geometry('SHAPE')
+        # Convert to GeoDataFrame in WGS84 (reprojected once, up front)
+        gdf = df if isinstance(df, gpd.GeoDataFrame) else sdf_to_geodataframe(df)
+        gdf = gdf[gdf.geometry.notna()]
+        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs(4326)
         
         # Calculate center point
         bounds = gdf.total_bounds
@@ -170,21 +204,21 @@ def create_layer_map(df, layer_title):
             tiles='OpenStreetMap'
         )
         
-        # Add features to map
-        for idx, row in gdf.iterrows():
-            if row.geometry is not None:
-                # Create popup content
-                popup_content = f"<b>{layer_title}</b><br>"
-                for col in df.columns:
-                    if col not in ['SHAPE', 'geometry'] and pd.notna(row[col]):
-                        popup_content += f"{col}: {row[col]}<br>"
-                
-                # Add geometry to map
-                folium.GeoJson(
-                    row.geometry.__geo_interface__,
-                    popup=popup_content,
-                    tooltip=f"Feature {idx + 1}"
-                ).add_to(m)
+        # Simplify to roughly screen resolution to keep the GeoJSON payload small
+        diagonal = ((bounds[2] - bounds[0]) ** 2 + (bounds[3] - bounds[1]) ** 2) ** 0.5
+        if diagonal > 0:
+            gdf = gdf.set_geometry(gdf.geometry.simplify(diagonal / 2000, preserve_topology=False))
+        
+        # Add all features as a single FeatureCollection (one serialization pass)
+        attribute_fields = [col for col in gdf.columns if col not in ['SHAPE', 'geometry']]
+        gdf = gdf.assign(feature_label=[f"Feature {i + 1}" for i in range(len(gdf))])
+        geojson_data = orjson.dumps(gdf.to_geo_dict(), default=str, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        folium.GeoJson(
+            geojson_data,
+            name=layer_title,
+            popup=folium.GeoJsonPopup(fields=attribute_fields) if attribute_fields else None,
+            tooltip=folium.GeoJsonTooltip(fields=['feature_label'], labels=False)
+        ).add_to(m)
         
         return m
         
@@ -192,12 +226,23 @@ def create_layer_map(df, layer_title):
         st.warning(f"Could not create map visualization: {str(e)}")
         return None
 
+@st.fragment
+def render_layer_map(df, layer_title):
+    """Render the preview map in its own fragment so map interactions don't rerun the page"""
+    from streamlit_folium import st_folium
+
+    layer_map = create_layer_map(df, layer_title)
+    if layer_map:
+        st_folium(layer_map, width=700, height=400)
+    else:
+        st.info("Map visualization not available for this layer")
+
 def preview_layer_data(layer_item, max_features=10):
     """Display layer data preview with map and table"""
     st.subheader(f"📊 Preview: {layer_item.title}")
     
     with st.spinner("Loading layer preview..."):
-        df, layer_info = get_layer_preview_data(layer_item.id, max_features)
+        df, layer_info = get_layer_preview_data(layer_item.id, max_features, layer_item)
     
     if df is not None and layer_info is not None:
         # Layer information
@@ -232,11 +277,7 @@ def preview_layer_data(layer_item, max_features=10):
         with tab2:
             # Display map
             if 'SHAPE' in df.columns:
-                layer_map = create_layer_map(df, layer_item.title)
-                if layer_map:
-                    st_folium(layer_map, width=700, height=400)
-                else:
-                    st.info("Map visualization not available for this layer")
+                render_layer_map(df, layer_item.title)
             else:
                 st.info("No spatial data available for map display")
         
@@ -269,32 +310,62 @@ def validate_zip_file(zip_file):
     except Exception as e:
         return False, f"Error reading zip file: {str(e)}"
 
-def extract_and_load_shapefile(zip_file):
-    """Extract zip file and load shapefile"""
+# Only these members are needed to read a shapefile; anything else in the archive is skipped
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+MAX_UNCOMPRESSED_BYTES = 1024 * 1024 * 1024  # 1 GB
+
+def shapefile_members(zip_ref):
+    """Return the shapefile component members of an open archive, rejecting oversized ones"""
+    members = [info for info in zip_ref.infolist()
+               if not info.is_dir() and info.filename.lower().endswith(SHAPEFILE_EXTENSIONS)]
+    
+    total_size = sum(info.file_size for info in members)
+    if total_size > MAX_UNCOMPRESSED_BYTES:
+        raise Exception(
+            f"Shapefile components are too large ({total_size / (1024 * 1024):.0f} MB uncompressed, "
+            f"limit {MAX_UNCOMPRESSED_BYTES / (1024 * 1024):.0f} MB)"
+        )
+    
+    return members
+
+def extract_shapefile_members(zip_ref, extract_path):
+    """Extract only the shapefile components from an open archive"""
+    members = shapefile_members(zip_ref)
+    for info in members:
+        zip_ref.extract(info, extract_path)
+    
+    return [info.filename for info in members]
+
+def load_shapefile_from_zip(zip_file):
+    """
+    Copy the shapefile components into a flat upload zip and read it in place via /vsizip/
+    Returns: (gdf, zip_path, temp_dir)
+    """
+    import geopandas as gpd
+
     temp_dir = tempfile.mkdtemp()
+    zip_path = os.path.join(temp_dir, "update.zip")
     
     try:
-        # Extract zip file
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
-        
-        # Find shapefile
-        shp_file = None
-        for root, dirs, files in os.walk(temp_dir):
-            for file in files:
-                if file.lower().endswith('.shp'):
-                    shp_file = os.path.join(root, file)
-                    break
-            if shp_file:
-                break
-        
-        if not shp_file:
+        # Stream components member-to-member; nothing is extracted to disk
+        shp_name = None
+        zip_file.seek(0)
+        with zipfile.ZipFile(zip_file, 'r') as source_zip, \
+                zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as upload_zip:
+            for info in shapefile_members(source_zip):
+                member_name = os.path.basename(info.filename)
+                if shp_name is None and member_name.lower().endswith('.shp'):
+                    shp_name = member_name
+                with source_zip.open(info) as src, upload_zip.open(member_name, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        
+        if not shp_name:
             raise Exception("No .shp file found in the archive")
         
-        # Load with geopandas
-        gdf = gpd.read_file(shp_file)
+        # Load with geopandas straight out of the archive
+        gdf = gpd.read_file(f"/vsizip/{zip_path}/{shp_name}", engine="pyogrio", use_arrow=True)
         
-        return gdf, temp_dir
+        return gdf, zip_path, temp_dir
     
     except Exception as e:
         # Clean up on error
@@ -302,6 +373,7 @@ def extract_and_load_shapefile(zip_file):
             shutil.rmtree(temp_dir)
         raise e
 
+@st.fragment
 def view_content():
     """Display user's existing content with enhanced UI and preview capabilities"""
     st.header("📋 Your ArcGIS Content")
@@ -311,25 +383,15 @@ def view_content():
         feature_layers = get_feature_layers(st.session_state.username)
         
         if feature_layers:
-            layer_data = []
-            for layer in feature_layers:
-                # Get FeatureServer URL
-                try:
-                    layer_collection = FeatureLayerCollection.fromitem(layer)
-                    feature_server_url = layer_collection.url
-                except:
-                    feature_server_url = "URL not available"
-                
-                layer_data.append({
-                    "Title": layer.title,
-                    "ID": layer.id,
-                    "Type": layer.type,
-                    "Owner": layer.owner,
-                    "Created": datetime.fromtimestamp(layer.created/1000).strftime('%Y-%m-%d'),
-                    "FeatureServer URL": feature_server_url
-                })
-            
-            df = pd.DataFrame(layer_data)
+            # Build the table column-wise; a hosted feature service item's url is its FeatureServer URL
+            df = pd.DataFrame({
+                "Title": [layer.title for layer in feature_layers],
+                "ID": [layer.id for layer in feature_layers],
+                "Type": [layer.type for layer in feature_layers],
+                "Owner": [layer.owner for layer in feature_layers],
+                "Created": [datetime.fromtimestamp(layer.created/1000).strftime('%Y-%m-%d') for layer in feature_layers],
+                "FeatureServer URL": [layer.url or "URL not available" for layer in feature_layers]
+            })
             st.dataframe(df, use_container_width=True)
             
             # Layer actions
@@ -337,7 +399,7 @@ def view_content():
             with col1:
                 if st.button("📥 Export Layer List as CSV"):
                     success, csv_data, error = safe_csv_export(
-                        layer_data, 
+                        df, 
                         operation_name="Layer list export"
                     )
                     if success:
@@ -373,22 +435,21 @@ def view_content():
         web_maps = get_web_maps(st.session_state.username)
         
         if web_maps:
-            map_data = []
-            for web_map in web_maps:
-                map_data.append({
-                    "Title": web_map.title,
-                    "ID": web_map.id,
-                    "Owner": web_map.owner,
-                    "Created": datetime.fromtimestamp(web_map.created/1000).strftime('%Y-%m-%d')
-                })
-            
-            df_maps = pd.DataFrame(map_data)
+            df_maps = pd.DataFrame({
+                "Title": [web_map.title for web_map in web_maps],
+                "ID": [web_map.id for web_map in web_maps],
+                "Owner": [web_map.owner for web_map in web_maps],
+                "Created": [datetime.fromtimestamp(web_map.created/1000).strftime('%Y-%m-%d') for web_map in web_maps]
+            })
             st.dataframe(df_maps, use_container_width=True)
         else:
             st.info("No web maps found in your account")
 
+@st.fragment
 def update_existing_layer():
     """Update an existing feature layer with enhanced UI and preview"""
+    from arcgis.features import FeatureLayerCollection
+
     st.header("🔄 Update Existing Layer")
     
     feature_layers = get_feature_layers(st.session_state.username)
@@ -414,7 +475,7 @@ def update_existing_layer():
             with col1:
                 st.info(f"Selected: {selected_layer.title}")
                 try:
-                    layer_collection = FeatureLayerCollection.fromitem(selected_layer)
+                    layer_collection = get_layer_collection(selected_layer.id, st.session_state.username, selected_layer)
                     st.code(f"FeatureServer URL: {layer_collection.url}")
                 except:
                     st.warning("Could not retrieve FeatureServer URL")
@@ -435,19 +496,28 @@ def update_existing_layer():
             )
             
             if uploaded_file:
-                # Validate zip file
-                is_valid, message = validate_zip_file(uploaded_file)
+                # Validate zip file (cached on content hash)
+                file_hash = upload_file_hash(uploaded_file)
+                is_valid, message = validate_uploaded_zip(uploaded_file, file_hash)
                 
                 if is_valid:
                     st.success(message)
                     
-                    # Preview new data before updating
+                    # Preview new data one page at a time, read straight from the archive
                     with st.expander("👀 Preview New Data"):
                         try:
-                            gdf, temp_dir = extract_and_load_shapefile(uploaded_file)
-                            st.write(f"**Records in new data:** {len(gdf)}")
-                            st.dataframe(gdf.head().drop(columns=['geometry'] if 'geometry' in gdf.columns else []))
-                            shutil.rmtree(temp_dir)
+                            page_key = f"preview_page_{file_hash}"
+                            page = st.session_state.get(page_key, 0)
+                            page_df, total = read_shapefile_page(file_hash, uploaded_file.getvalue(), page)
+                            page_count = max(1, -(-total // PREVIEW_PAGE_SIZE))
+                            
+                            st.write(f"**Records in new data:** {total}")
+                            st.dataframe(page_df)
+                            if page_count > 1:
+                                st.number_input(
+                                    f"Page (of {page_count})", min_value=0, max_value=page_count - 1,
+                                    step=1, key=page_key
+                                )
                         except Exception as e:
                             st.warning(f"Could not preview new data: {str(e)}")
                     
@@ -460,17 +530,8 @@ def update_existing_layer():
                         if confirm_update and st.button("🔄 Update Layer", type="primary"):
                             try:
                                 with st.spinner("Updating layer..."):
-                                    # Extract and load shapefile
-                                    gdf, temp_dir = extract_and_load_shapefile(uploaded_file)
-                                    
-                                    # Create temporary zip for upload
-                                    temp_zip_path = os.path.join(temp_dir, "update.zip")
-                                    with zipfile.ZipFile(temp_zip_path, 'w') as zip_ref:
-                                        for root, dirs, files in os.walk(temp_dir):
-                                            for file in files:
-                                                if not file.endswith('.zip'):
-                                                    file_path = os.path.join(root, file)
-                                                    zip_ref.write(file_path, file)
+                                    # Build the upload zip and load the shapefile from it
+                                    gdf, temp_zip_path, temp_dir = load_shapefile_from_zip(uploaded_file)
                                     
                                     # Update layer
                                     layer_collection = FeatureLayerCollection.fromitem(selected_layer)
@@ -555,7 +616,7 @@ def safe_csv_export(data, filename=None, operation_name="CSV export"):
         filename: Optional filename
         operation_name: Name of operation for error reporting
     Returns:
-        (success, csv_string, error_message)
+        (success, csv_bytes, error_message)
     """
     try:
         # Convert to DataFrame if needed
@@ -563,43 +624,44 @@ def safe_csv_export(data, filename=None, operation_name="CSV export"):
         if not success:
             return False, None, error
         
-        # Generate CSV string
-        csv_string = df.to_csv(index=False)
+        # Render the CSV once; the same bytes feed the download and the optional file
+        buffer = io.BytesIO()
+        df.to_csv(buffer, index=False, encoding='utf-8')
+        csv_bytes = buffer.getvalue()
         
         # Optionally save to file
         if filename:
-            df.to_csv(filename, index=False)
+            with open(filename, 'wb') as f:
+                f.write(csv_bytes)
             
-        return True, csv_string, None
+        return True, csv_bytes, None
         
     except Exception as e:
         return False, None, f"Error during {operation_name}: {str(e)}"
 
 
-def process_shapefile_upload(zip_file):
+def process_shapefile_upload(zip_file, bbox=None):
     """
     Comprehensive shapefile processing with detailed error handling for empty .dbf files
+    bbox: optional (minx, miny, maxx, maxy) in the shapefile's CRS; only intersecting features are read
     Returns: (success, geometry_type, field_names, gdf, error_message)
     """
+    import geopandas as gpd
+
     temp_dir = None
     try:
         # Create temporary directory
         temp_dir = tempfile.mkdtemp(prefix="shapefile_")
-        zip_path = os.path.join(temp_dir, "uploaded.zip")
         
         # Log processing start
         with open("update_log.txt", "a") as log_file:
             log_file.write(f"[{datetime.now()}] Starting shapefile processing\n")
         
-        # Save uploaded file
+        # Analyze zip contents and extract only the shapefile components
         zip_file.seek(0)
-        with open(zip_path, "wb") as f:
-            f.write(zip_file.getvalue())
-        
-        # Extract and analyze zip contents
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
             file_list = zip_ref.namelist()
-            zip_ref.extractall(temp_dir)
+            extract_shapefile_members(zip_ref, temp_dir)
         
         # Log extracted files
         with open("update_log.txt", "a") as log_file:
@@ -628,7 +690,7 @@ def process_shapefile_upload(zip_file):
                 shx_files.append((full_path, filename))
         
         if not shp_files:
-            file_names = [f[2] for f in all_files]
+            file_names = [os.path.basename(name) for name in file_list if not name.endswith('/')]
             return False, None, None, None, f"No .shp file found. Available files: {file_names}"
         
         # Use first shapefile found
@@ -672,7 +734,7 @@ def process_shapefile_upload(zip_file):
         
         # Attempt to read shapefile with robust error handling
         try:
-            gdf = gpd.read_file(shp_path)
+            gdf = gpd.read_file(shp_path, engine="pyogrio", use_arrow=True, bbox=bbox)
             with open("update_log.txt", "a") as log_file:
                 log_file.write(f"[{datetime.now()}] Successfully read shapefile with GeoPandas\n")
         except Exception as read_error:
@@ -691,6 +753,8 @@ def process_shapefile_upload(zip_file):
             return False, None, None, None, "Shapefile read returned None"
         
         if len(gdf) == 0:
+            if bbox is not None:
+                return False, None, None, None, "No features intersect the extent filter"
             return False, None, None, None, "Shapefile contains no features"
         
         # Check geometry column
@@ -730,10 +794,11 @@ def process_shapefile_upload(zip_file):
             gdf.crs = "EPSG:4326"
             with open("update_log.txt", "a") as log_file:
                 log_file.write(f"[{datetime.now()}] No CRS found, assuming WGS84\n")
-        elif gdf.crs.to_string() != "EPSG:4326":
+        elif not gdf.crs.equals(4326, ignore_axis_order=True):
+            # Compared as CRS objects so ESRI-style WGS84 .prj files are not needlessly reprojected
             try:
                 original_crs = gdf.crs.to_string()
-                gdf = gdf.to_crs("EPSG:4326")
+                gdf = gdf.to_crs(epsg=4326)
                 st.info(f"Reprojected from {original_crs} to WGS84")
                 with open("update_log.txt", "a") as log_file:
                     log_file.write(f"[{datetime.now()}] Reprojected from {original_crs} to WGS84\n")
@@ -768,6 +833,94 @@ def process_shapefile_upload(zip_file):
                     log_file.write(f"[{datetime.now()}] Cleanup error: {str(cleanup_error)}\n")
 
 
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def load_shapefile_cached(file_hash, _file_bytes, bbox=None):
+    """Process an uploaded shapefile zip once per unique upload and extent (keyed on content hash)"""
+    return process_shapefile_upload(io.BytesIO(_file_bytes), bbox=bbox)
+
+
+def upload_file_hash(uploaded_file, chunk_size=1 << 20):
+    """Content hash used to key cached shapefile processing (read in 1 MiB chunks)"""
+    digest = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(chunk_size), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def validate_zip_cached(file_hash, _file_bytes):
+    """Validate an uploaded zip once per unique upload (keyed on content hash)"""
+    return validate_zip_file(io.BytesIO(_file_bytes))
+
+
+def validate_uploaded_zip(uploaded_file, file_hash=None):
+    """Hash the uploaded zip and return the cached validation result"""
+    if file_hash is None:
+        file_hash = upload_file_hash(uploaded_file)
+    return validate_zip_cached(file_hash, uploaded_file.getvalue())
+
+
+def process_uploaded_shapefile(uploaded_file, file_hash=None, bbox=None):
+    """Hash the uploaded zip and return the cached processing result"""
+    if file_hash is None:
+        file_hash = upload_file_hash(uploaded_file)
+    return load_shapefile_cached(file_hash, uploaded_file.getvalue(), bbox)
+
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=3600)
+def read_shapefile_page(file_hash, _file_bytes, page, page_size=PREVIEW_PAGE_SIZE):
+    """
+    Read a single page of attributes from an uploaded shapefile zip (skips to the page via the .shx index)
+    Returns: (DataFrame, total_feature_count)
+    """
+    import pyogrio
+
+    total = pyogrio.read_info(io.BytesIO(_file_bytes))['features']
+    page_df = pyogrio.read_dataframe(
+        io.BytesIO(_file_bytes),
+        read_geometry=False,
+        skip_features=min(page * page_size, total),
+        max_features=page_size
+    )
+    return page_df, total
+
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def read_shapefile_bounds(file_hash, _file_bytes):
+    """Total bounds (minx, miny, maxx, maxy) of an uploaded shapefile zip, or None if unavailable"""
+    import pyogrio
+
+    bounds = pyogrio.read_info(io.BytesIO(_file_bytes), force_total_bounds=True).get('total_bounds')
+    if bounds is None or not np.isfinite(bounds).all():
+        return None
+    return tuple(float(value) for value in bounds)
+
+
+def extent_filter_input(key, default_bounds=None):
+    """
+    Optional bounding box for reading only part of a large shapefile
+    default_bounds: the dataset's (minx, miny, maxx, maxy), used as the starting box
+    Returns: (minx, miny, maxx, maxy) in the shapefile's CRS, or None for a full read
+    """
+    if not st.checkbox("Extent filter", key=f"{key}_enabled",
+                       help="Only read features intersecting this bounding box (coordinates in the shapefile's CRS)"):
+        return None
+    
+    cols = st.columns(4)
+    labels = ("Min X", "Min Y", "Max X", "Max Y")
+    bbox = tuple(
+        col.number_input(label, value=default, format="%.6f", key=f"{key}_{label.replace(' ', '_').lower()}")
+        for col, label, default in zip(cols, labels, default_bounds or (0.0,) * 4)
+    )
+    
+    if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        st.warning("Extent filter ignored: min values must be less than max values")
+        return None
+    return bbox
+
+
 def get_shapefile_info_geopandas(zip_file):
     """Legacy wrapper for compatibility"""
     success, geometry_type, field_names, gdf, error = process_shapefile_upload(zip_file)
@@ -776,8 +929,13 @@ def get_shapefile_info_geopandas(zip_file):
     else:
         return None, None, error
 
+@st.fragment
 def create_new_layer():
     """Create a new feature layer with enhanced UI and customization"""
+    import geopandas as gpd
+    from arcgis.features import FeatureLayerCollection
+    from arcgis.geometry import Geometry
+
     st.header("➕ Create New Layer")
     
     # Layer details section
@@ -790,7 +948,7 @@ def create_new_layer():
         
         with col2:
             layer_tags = st.text_input("Tags (comma-separated)", placeholder="tag1, tag2, tag3")
-            sharing_level = st.selectbox("Sharing Level", ["private", "org", "public"])
+            sharing_level = st.selectbox("Sharing Level", SHARING_LEVELS)
     
     # File upload section
     with st.expander("📁 Upload Shapefile", expanded=True):
@@ -809,18 +967,27 @@ def create_new_layer():
         selected_fields = []
         
         if uploaded_file:
-            # Validate and analyze the shapefile
-            is_valid, message = validate_zip_file(uploaded_file)
+            # Validate and analyze the shapefile (both cached on content hash)
+            file_hash = upload_file_hash(uploaded_file)
+            is_valid, message = validate_uploaded_zip(uploaded_file, file_hash)
             
             if is_valid:
                 st.success(message)
                 
+                # Optional spatial filter pushed down to the reader
+                # Start from the dataset's own extent so enabling the filter never reads an empty box;
+                # keyed per upload so a new file gets its own defaults
+                bbox = extent_filter_input(
+                    f"create_extent_{file_hash}",
+                    read_shapefile_bounds(file_hash, uploaded_file.getvalue())
+                )
+                
                 # Add debug toggle
                 debug_mode = st.checkbox("Show debug information", help="Display detailed processing information and data preview")
                 
                 # Process shapefile with comprehensive error handling
                 with st.spinner("Analyzing shapefile..."):
-                    success, geometry_type, field_names, gdf, error = process_shapefile_upload(uploaded_file)
+                    success, geometry_type, field_names, gdf, error = process_uploaded_shapefile(uploaded_file, file_hash, bbox)
                 
                 # Debug output
                 if debug_mode and success:
@@ -838,13 +1005,12 @@ def create_new_layer():
                         st.write(f"**Valid Geometries:** {gdf.geometry.notna().sum()}")
                     
                     st.write("**Data Preview:**")
-                    st.dataframe(gdf.head())
+                    st.dataframe(gdf.head().drop(columns=['geometry'], errors='ignore'))
                     
                     # Show recent log entries
                     try:
                         with open("update_log.txt", "r") as log_file:
-                            log_lines = log_file.readlines()
-                            recent_logs = log_lines[-10:]  # Last 10 entries
+                            recent_logs = deque(log_file, maxlen=10)  # Last 10 entries
                             st.write("**Recent Log Entries:**")
                             for line in recent_logs:
                                 st.text(line.strip())
@@ -893,10 +1059,17 @@ def create_new_layer():
                     if field_names:
                         st.write(f"**Available fields:** {', '.join(field_names)}")
                     
-                    # Store the processed data in session state for later use
-                    st.session_state['processed_gdf'] = gdf
-                    st.session_state['shapefile_geometry_type'] = geometry_type
-                    st.session_state['shapefile_fields'] = field_names
+                    # Keep only lightweight metadata in session state; publish reads the data back
+                    # from load_shapefile_cached, which hands every caller its own copy
+                    st.session_state['processed_shapefile'] = {
+                        'hash': file_hash,
+                        'bbox': bbox,
+                        'name': uploaded_file.name,
+                        'geometry_type': geometry_type,
+                        'fields': field_names,
+                        'record_count': len(gdf),
+                        'crs': gdf.crs.to_string() if gdf.crs else None
+                    }
                     
                     # Styling configuration
                     with st.expander("🎨 Layer Styling", expanded=True):
@@ -936,7 +1109,7 @@ def create_new_layer():
                         if len(gdf) > 0:
                             st.write("**First 5 features:**")
                             # Show non-geometry columns for preview
-                            preview_df = gdf[field_names].head()
+                            preview_df = gdf.head()[field_names]
                             st.dataframe(preview_df)
             else:
                 st.error(message)
@@ -983,15 +1156,21 @@ def create_new_layer():
                     st.write("• Popups: Disabled")
             
             if st.button("🚀 Create and Publish Layer", type="primary"):
-                if 'processed_gdf' not in st.session_state:
+                processed_shapefile = st.session_state.get('processed_shapefile')
+                if not processed_shapefile:
                     st.error("Please upload and process a shapefile first")
                 else:
                     try:
                         with st.spinner("Creating new layer with custom styling..."):
-                            # Get processed shapefile data
-                            gdf = st.session_state['processed_gdf']
-                            geometry_type = st.session_state['shapefile_geometry_type']
-                            field_names = st.session_state['shapefile_fields']
+                            # Get processed shapefile data (a cache hit; the upload was processed above)
+                            success, _, _, gdf, error = process_uploaded_shapefile(
+                                uploaded_file, processed_shapefile['hash'], processed_shapefile['bbox']
+                            )
+                            if not success:
+                                st.error(error)
+                                return
+                            geometry_type = processed_shapefile['geometry_type']
+                            field_names = processed_shapefile['fields']
                             
                             # Log creation attempt
                             with open("update_log.txt", "a") as log_file:
@@ -1005,8 +1184,8 @@ def create_new_layer():
                             with open("update_log.txt", "a") as log_file:
                                 log_file.write(f"[{datetime.now()}] DataFrame shape: {gdf.shape}, columns: {list(gdf.columns)}\n")
                             
-                            # Ensure coordinate system is WGS84
-                            if gdf.crs and gdf.crs.to_string() != "EPSG:4326":
+                            # process_shapefile_upload already reprojected to WGS84; only retry if that failed
+                            if processed_shapefile['crs'] not in (None, "EPSG:4326"):
                                 gdf = gdf.to_crs("EPSG:4326")
                                 with open("update_log.txt", "a") as log_file:
                                     log_file.write(f"[{datetime.now()}] Reprojected to WGS84 for layer creation\n")
@@ -1042,32 +1221,18 @@ def create_new_layer():
                             # Step 2: Direct layer creation bypassing CSV conversion
                             try:
                                 with open("update_log.txt", "a") as log_file:
-                                    log_file.write(f"[{datetime.now()}] Using direct shapefile upload method to bypass CSV issues\n")
+                                    log_file.write(f"[{datetime.now()}] Using direct DataFrame publishing to bypass CSV issues\n")
                                 
-                                # Method 1: Use temporary file approach
-                                import tempfile
-                                import shutil
+                                # Publish straight from the data frame; no temporary shapefile on disk
+                                sdf = pd.DataFrame.spatial.from_geodataframe(gdf)
+                                feature_service = sdf.spatial.to_featurelayer(
+                                    title=unique_title,
+                                    gis=st.session_state.gis,
+                                    tags=", ".join(tag.strip() for tag in layer_tags.split(',') if tag.strip()) if layer_tags else "shapefile, uploaded"
+                                )
                                 
-                                # Create temporary directory for clean shapefile
-                                with tempfile.TemporaryDirectory() as temp_dir:
-                                    # Copy processed shapefile to temp directory
-                                    temp_shp_path = os.path.join(temp_dir, "temp_layer.shp")
-                                    
-                                    # Write GeoDataFrame as shapefile
-                                    gdf.to_file(temp_shp_path, driver='ESRI Shapefile')
-                                    
-                                    with open("update_log.txt", "a") as log_file:
-                                        log_file.write(f"[{datetime.now()}] Created temporary shapefile at {temp_shp_path}\n")
-                                    
-                                    # Upload shapefile directly to ArcGIS
-                                    feature_service = st.session_state.gis.content.import_data(
-                                        temp_shp_path,
-                                        title=unique_title,
-                                        tags=[tag.strip() for tag in layer_tags.split(',') if tag.strip()] if layer_tags else ["shapefile", "uploaded"]
-                                    )
-                                    
-                                    with open("update_log.txt", "a") as log_file:
-                                        log_file.write(f"[{datetime.now()}] Successfully uploaded using temporary shapefile method\n")
+                                with open("update_log.txt", "a") as log_file:
+                                    log_file.write(f"[{datetime.now()}] Successfully published from spatially enabled DataFrame\n")
                                 
                                 # Verify the service was created
                                 if feature_service and hasattr(feature_service, 'id'):
@@ -1078,7 +1243,7 @@ def create_new_layer():
                                     raise Exception("Layer creation returned invalid result")
                                     
                                 with open("update_log.txt", "a") as log_file:
-                                    log_file.write(f"[{datetime.now()}] Published layer using direct shapefile upload method\n")
+                                    log_file.write(f"[{datetime.now()}] Published layer using direct DataFrame publishing\n")
                             except Exception as spatial_error:
                                 # Enhanced fallback using safe data handling
                                 with open("update_log.txt", "a") as log_file:
@@ -1089,16 +1254,11 @@ def create_new_layer():
                                     with open("update_log.txt", "a") as log_file:
                                         log_file.write(f"[{datetime.now()}] Attempting CSV-compatible layer creation\n")
                                     
-                                    # Convert GeoDataFrame to CSV-compatible format
-                                    df_for_csv = gdf.copy()
-                                    
-                                    # Convert geometry to WKT
-                                    if 'geometry' in df_for_csv.columns:
-                                        df_for_csv['wkt_geometry'] = df_for_csv['geometry'].to_wkt()
-                                        df_for_csv = df_for_csv.drop(columns=['geometry'])
-                                    
-                                    # Convert to pandas DataFrame
-                                    df_clean = pd.DataFrame(df_for_csv)
+                                    # Convert GeoDataFrame to CSV-compatible format: drop() already returns a new frame,
+                                    # so the geometry is written once as vectorized WKT without copying the whole GeoDataFrame
+                                    df_clean = pd.DataFrame(gdf.drop(columns=['geometry'], errors='ignore'))
+                                    if 'geometry' in gdf.columns:
+                                        df_clean['wkt_geometry'] = gdf.geometry.to_wkt()
                                     
                                     # Create temporary CSV file
                                     import tempfile
@@ -1124,37 +1284,32 @@ def create_new_layer():
                                     with open("update_log.txt", "a") as log_file:
                                         log_file.write(f"[{datetime.now()}] CSV method failed: {str(csv_error)}, using minimal fallback\n")
                                     
-                                    # Create simplified features with only basic attributes
-                                    features = []
-                                    for idx, row in gdf.iterrows():
-                                        try:
-                                            geom = row.geometry
-                                            if geom is not None and hasattr(geom, '__geo_interface__'):
-                                                geom_dict = geom.__geo_interface__
-                                                
-                                                # Create minimal attributes (avoid complex data types)
-                                                attributes = {'OBJECTID': idx + 1}
-                                                
-                                                # Only add string/numeric fields
-                                                for field in field_names:
-                                                    try:
-                                                        value = row[field]
-                                                        if pd.notna(value):
-                                                            # Convert to string to avoid type issues
-                                                            attributes[field] = str(value)[:255]
-                                                    except:
-                                                        # Skip problematic fields
-                                                        continue
-                                                
-                                                features.append({
-                                                    'geometry': geom_dict,
-                                                    'attributes': attributes
-                                                })
-                                        except Exception as feature_error:
-                                            # Skip problematic features
-                                            with open("update_log.txt", "a") as log_file:
-                                                log_file.write(f"[{datetime.now()}] Skipping feature {idx}: {str(feature_error)}\n")
-                                            continue
+                                    # Create simplified features with only basic attributes,
+                                    # converting geometry and attribute columns in bulk
+                                    valid_gdf = gdf[gdf.geometry.notna()]
+                                    skipped = len(gdf) - len(valid_gdf)
+                                    if skipped:
+                                        with open("update_log.txt", "a") as log_file:
+                                            log_file.write(f"[{datetime.now()}] Skipping {skipped} features without geometry\n")
+                                    
+                                    # Only add string/numeric fields, converted to strings to avoid type issues
+                                    attribute_columns = {}
+                                    for field in field_names:
+                                        if field in valid_gdf.columns:
+                                            values = valid_gdf[field]
+                                            attribute_columns[field] = values.astype(str).str.slice(0, 255).astype(object).where(values.notna(), None)
+                                    attribute_df = pd.DataFrame(attribute_columns, index=valid_gdf.index)
+                                    attribute_df.insert(0, 'OBJECTID', valid_gdf.index + 1)
+                                    
+                                    # Feature collections need Esri JSON geometry (x/y, paths, rings), not GeoJSON
+                                    spatial_reference = {'wkid': 4326}
+                                    features = [
+                                        {
+                                            'geometry': Geometry.from_shapely(geom, spatial_reference),
+                                            'attributes': {k: v for k, v in attributes.items() if v is not None}
+                                        }
+                                        for geom, attributes in zip(valid_gdf.geometry.values, attribute_df.to_dict('records'))
+                                    ]
                                     
                                     if not features:
                                         raise Exception("No valid features could be created from the shapefile")
@@ -1255,6 +1410,7 @@ def create_new_layer():
                         # Verify layer is accessible in portal
                         portal_link = f"https://www.arcgis.com/home/item.html?id={feature_service.id}"
                         
+                        search_user_items.clear()
                         st.success("Layer created successfully with custom styling!")
                         st.markdown(f"**🔗 View in ArcGIS Online:** [Open Layer in Portal]({portal_link})")
                         st.info(f"Records created: {len(gdf)}")
@@ -1262,16 +1418,8 @@ def create_new_layer():
                         
                         # Verify layer appears in user's content
                         try:
-                            import time
-                            time.sleep(3)  # Allow portal indexing time
-                            
-                            # Search for the newly created layer
-                            search_results = st.session_state.gis.content.search(
-                                query=f"id:{feature_service.id}",
-                                max_items=1
-                            )
-                            
-                            if search_results:
+                            # Return as soon as the portal has indexed the item instead of always waiting
+                            if wait_for_item_indexed(st.session_state.gis, feature_service.id):
                                 st.info("✅ Layer verified and available in your ArcGIS Online portal")
                                 with open("update_log.txt", "a") as log_file:
                                     log_file.write(f"[{datetime.now()}] Layer successfully verified in portal\n")
@@ -1317,58 +1465,91 @@ def create_new_layer():
                         
                         # Add to selected web maps
                         if web_maps and selected_maps:
-                            for map_key in selected_maps:
-                                try:
-                                    web_map = map_options[map_key]
-                                    web_map_item = st.session_state.gis.content.get(web_map.id)
-                                    
-                                    # Add layer to web map
-                                    web_map_obj = web_map_item.get_data()
-                                    
-                                    # Create layer definition
-                                    layer_def = {
-                                        "id": feature_service.id,
-                                        "title": layer_title,
-                                        "url": feature_server_url,
-                                        "visibility": True,
-                                        "opacity": 1
-                                    }
-                                    
-                                    # Add to operational layers
-                                    if 'operationalLayers' not in web_map_obj:
-                                        web_map_obj['operationalLayers'] = []
-                                    web_map_obj['operationalLayers'].append(layer_def)
-                                    
-                                    # Update web map
-                                    web_map_item.update(data=json.dumps(web_map_obj))
-                                    st.success(f"Added to web map: {web_map.title}")
-                                    
-                                except Exception as e:
-                                    st.warning(f"Could not add to web map {web_map.title}: {str(e)}")
+                            def add_to_web_map(web_map):
+                                """Add the new layer to one web map; runs in a worker thread"""
+                                # The search result is already the web map Item; no need to fetch it again
+                                web_map_obj = web_map.get_data()
+                                
+                                # Create layer definition
+                                layer_def = {
+                                    "id": feature_service.id,
+                                    "title": layer_title,
+                                    "url": feature_server_url,
+                                    "visibility": True,
+                                    "opacity": 1
+                                }
+                                
+                                # Add to operational layers
+                                if 'operationalLayers' not in web_map_obj:
+                                    web_map_obj['operationalLayers'] = []
+                                web_map_obj['operationalLayers'].append(layer_def)
+                                
+                                # Update web map (web map JSON can be large; orjson encodes it much faster)
+                                web_map.update(data=orjson.dumps(web_map_obj).decode())
+                            
+                            # Each web map update is independent, so run them concurrently
+                            with ThreadPoolExecutor(max_workers=min(4, len(selected_maps))) as executor:
+                                futures = {
+                                    executor.submit(add_to_web_map, map_options[map_key]): map_options[map_key]
+                                    for map_key in selected_maps
+                                }
+                                for future in as_completed(futures):
+                                    web_map = futures[future]
+                                    try:
+                                        future.result()
+                                        st.success(f"Added to web map: {web_map.title}")
+                                    except Exception as e:
+                                        st.warning(f"Could not add to web map {web_map.title}: {str(e)}")
                         
                             # Show sample data
                             st.subheader("Sample of created data")
                             st.dataframe(gdf.head().drop(columns=['geometry'] if 'geometry' in gdf.columns else []))
-                            
-                            # Clear processed data from session state
-                            if 'processed_gdf' in st.session_state:
-                                del st.session_state['processed_gdf']
-                            if 'shapefile_geometry_type' in st.session_state:
-                                del st.session_state['shapefile_geometry_type']
-                            if 'shapefile_fields' in st.session_state:
-                                del st.session_state['shapefile_fields']
                         
                     except Exception as e:
                         st.error(f"Error creating layer: {str(e)}")
                         # Log error
                         with open("update_log.txt", "a") as log_file:
                             log_file.write(f"[{datetime.now()}] Error creating layer '{layer_title}': {str(e)}\n")
+                    finally:
+                        # Clear processed metadata whether or not publishing succeeded
+                        st.session_state.pop('processed_shapefile', None)
     
     if uploaded_file and not layer_title:
         st.warning("Please enter a layer title")
 
+def fetch_layer_features(layer):
+    """Query all features of a layer; safe to run in a worker thread (no Streamlit calls)"""
+    from arcgis.features import FeatureLayerCollection
+
+    try:
+        layer_collection = FeatureLayerCollection.fromitem(layer)
+        feature_layer = layer_collection.layers[0]
+        
+        # Query all features, page by page so large layers are not truncated
+        pages = query_feature_pages(feature_layer)
+        if not pages:
+            return {'gdf': None, 'error': None}
+        
+        # Convert each page to a GeoDataFrame and combine them
+        page_frames = []
+        for page in pages:
+            page_df = page.sdf
+            page_frames.append(sdf_to_geodataframe(page_df) if 'SHAPE' in page_df.columns else page_df)
+        layer_gdf = pd.concat(page_frames, ignore_index=True) if len(page_frames) > 1 else page_frames[0]
+        
+        # Add source layer information
+        layer_gdf['source_layer'] = layer.title
+        return {'gdf': layer_gdf, 'error': None}
+    
+    except Exception as e:
+        return {'gdf': None, 'error': str(e)}
+
+@st.fragment
 def merge_layers():
     """Merge multiple feature layers with enhanced UI and validation"""
+    import geopandas as gpd
+    from arcgis.features import FeatureLayerCollection
+
     st.header("🔗 Merge Layers")
     
     feature_layers = get_feature_layers(st.session_state.username)
@@ -1397,16 +1578,24 @@ def merge_layers():
                 st.error(compatibility_message)
                 return
             
-            # Show selected layers info with preview option
+            # Show selected layers in a single table with one preview selector
             st.subheader("Selected Layers")
-            for layer_key in selected_layers:
-                layer = layer_options[layer_key]
-                col1, col2 = st.columns([3, 1])
-                with col1:
-                    st.write(f"• {layer.title}")
-                with col2:
-                    if st.button(f"Preview", key=f"preview_{layer.id}"):
-                        preview_layer_data(layer)
+            st.dataframe(
+                pd.DataFrame({
+                    'Title': [layer.title for layer in selected_layer_objects],
+                    'ID': [layer.id for layer in selected_layer_objects]
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            preview_key = st.selectbox(
+                "Preview a selected layer",
+                options=[""] + selected_layers,
+                key="merge_preview_layer"
+            )
+            if preview_key:
+                preview_layer_data(layer_options[preview_key])
         
         elif len(selected_layers) == 1:
             st.info("Please select at least one more layer to merge")
@@ -1422,7 +1611,7 @@ def merge_layers():
             
             with col2:
                 merged_tags = st.text_input("Tags (comma-separated)", placeholder="tag1, tag2, tag3")
-                sharing_level = st.selectbox("Sharing Level", ["private", "org", "public"], key="merge_sharing")
+                sharing_level = st.selectbox("Sharing Level", SHARING_LEVELS, key="merge_sharing")
         
         if merged_title and st.button("Merge Layers", type="primary"):
             try:
@@ -1430,44 +1619,46 @@ def merge_layers():
                     merged_gdf = None
                     total_records = 0
                     
-                    # Collect data from all selected layers
-                    for layer_key in selected_layers:
-                        layer = layer_options[layer_key]
+                    # Query all selected layers concurrently; the work is network-bound
+                    layers_to_fetch = [layer_options[layer_key] for layer_key in selected_layers]
+                    results = {}
+                    with st.status(f"Querying {len(layers_to_fetch)} layers...", expanded=False) as status:
+                        with ThreadPoolExecutor(max_workers=min(8, len(layers_to_fetch))) as executor:
+                            futures = {executor.submit(fetch_layer_features, layer): layer for layer in layers_to_fetch}
+                            for future in as_completed(futures):
+                                layer = futures[future]
+                                results[layer.id] = future.result()
+                                status.update(label=f"Queried {layer.title} ({len(results)}/{len(layers_to_fetch)})")
                         
-                        try:
-                            # Get layer data
-                            layer_collection = FeatureLayerCollection.fromitem(layer)
-                            feature_layer = layer_collection.layers[0]
-                            
-                            # Query all features
-                            feature_set = feature_layer.query()
-                            
-                            if feature_set.features:
-                                # Convert to GeoDataFrame
-                                layer_gdf = feature_set.sdf
-                                
-                                if 'SHAPE' in layer_gdf.columns:
-                                    layer_gdf = layer_gdf.set_geometry('SHAPE')
-                                
-                                # Add source layer information
-                                layer_gdf['source_layer'] = layer.title
-                                
-                                # Merge with existing data
-                                if merged_gdf is None:
-                                    merged_gdf = layer_gdf
-                                else:
-                                    # Align columns
-                                    common_columns = list(set(merged_gdf.columns) & set(layer_gdf.columns))
-                                    merged_gdf = pd.concat([
-                                        merged_gdf[common_columns],
-                                        layer_gdf[common_columns]
-                                    ], ignore_index=True)
-                                
-                                total_records += len(layer_gdf)
-                                st.info(f"Added {len(layer_gdf)} records from {layer.title}")
+                        # Collect frames in selection order so the output is deterministic
+                        layer_frames = []
+                        failed_layers = 0
+                        for layer in layers_to_fetch:
+                            result = results[layer.id]
+                            if result['error']:
+                                failed_layers += 1
+                                status.write(f"⚠️ Could not process layer {layer.title}: {result['error']}")
+                            elif result['gdf'] is not None:
+                                layer_frames.append(result['gdf'])
+                                status.write(f"Added {len(result['gdf'])} records from {layer.title}")
                         
-                        except Exception as e:
-                            st.warning(f"Could not process layer {layer.title}: {str(e)}")
+                        # Open the status on failures so skipped layers aren't hidden behind a green check
+                        if failed_layers:
+                            status.update(
+                                label=f"Queried {len(layers_to_fetch)} layers, {failed_layers} skipped",
+                                state="error",
+                                expanded=True
+                            )
+                        else:
+                            status.update(label=f"Queried {len(layers_to_fetch)} layers", state="complete")
+                    
+                    # Concatenate once on the columns shared by every layer
+                    if layer_frames:
+                        common_columns = layer_frames[0].columns
+                        for frame in layer_frames[1:]:
+                            common_columns = common_columns.intersection(frame.columns, sort=False)
+                        merged_gdf = pd.concat([frame[common_columns] for frame in layer_frames], ignore_index=True)
+                        total_records = len(merged_gdf)
                     
                     if merged_gdf is not None and len(merged_gdf) > 0:
                         # Save merged data to temporary shapefile using merged layer title
@@ -1477,22 +1668,14 @@ def merge_layers():
                         safe_title = safe_title.replace(' ', '_')
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                         shapefile_name = f"{safe_title}_{timestamp}"
-                        shapefile_path = os.path.join(temp_dir, f"{shapefile_name}.shp")
                         
                         # Convert to GeoDataFrame if needed
                         if not isinstance(merged_gdf, gpd.GeoDataFrame):
                             merged_gdf = gpd.GeoDataFrame(merged_gdf)
                         
-                        merged_gdf.to_file(shapefile_path)
-                        
-                        # Create zip file with unique name
-                        zip_path = os.path.join(temp_dir, f"{shapefile_name}.zip")
-                        with zipfile.ZipFile(zip_path, 'w') as zip_ref:
-                            for root, dirs, files in os.walk(temp_dir):
-                                for file in files:
-                                    if not file.endswith('.zip'):
-                                        file_path = os.path.join(root, file)
-                                        zip_ref.write(file_path, file)
+                        # GDAL writes the zipped shapefile directly (.shp.zip), no separate zip pass
+                        zip_path = os.path.join(temp_dir, f"{shapefile_name}.shp.zip")
+                        merged_gdf.to_file(zip_path, driver='ESRI Shapefile', engine='pyogrio', use_arrow=True)
                         
                         # Prepare item properties
                         item_properties = {
@@ -1518,6 +1701,7 @@ def merge_layers():
                         layer_collection = FeatureLayerCollection.fromitem(feature_service)
                         feature_server_url = layer_collection.url
                         
+                        search_user_items.clear()
                         st.success("Layers merged successfully!")
                         st.info(f"Total records in merged layer: {len(merged_gdf)}")
                         st.code(f"FeatureServer URL: {feature_server_url}")
@@ -1535,6 +1719,7 @@ def merge_layers():
             except Exception as e:
                 st.error(f"Error merging layers: {str(e)}")
 
+@st.fragment
 def delete_layer():
     """Delete a feature layer with enhanced safety and preview"""
     st.header("🗑️ Delete Layer")
@@ -1600,6 +1785,7 @@ def delete_layer():
                                 result = selected_layer.delete()
                                 
                                 if result:
+                                    search_user_items.clear()
                                     st.success(f"Layer '{selected_layer.title}' has been deleted successfully")
                                     st.info("The layer has been permanently removed from your ArcGIS Online account")
                                 else:
@@ -1681,6 +1867,226 @@ def create_popup_info(field_names):
         "mediaInfos": []
     }
 
+EDIT_BATCH_SIZE = 1000  # same default as the batch_size user setting
+
+# Example WKT shown in the bulk-add hint, per layer geometry type
+WKT_EXAMPLES = {
+    'esriGeometryPoint': "POINT (x y)",
+    'esriGeometryMultipoint': "MULTIPOINT ((x1 y1), (x2 y2))",
+    'esriGeometryPolyline': "LINESTRING (x1 y1, x2 y2)",
+    'esriGeometryPolygon': "POLYGON ((x1 y1, x2 y2, x3 y3, x1 y1))",
+}
+
+def apply_edits_in_batches(feature_layer, adds=(), updates=(), delete_ids=(), batch_size=EDIT_BATCH_SIZE, max_workers=4):
+    """
+    Send adds, updates and deletes together in edit_features calls of up to batch_size features
+    Returns: success counts per operation, plus 'errors' (one message per failed request); a failed
+    request does not stop the others, so the counts cover every batch that went through
+    """
+    # Mixed edit sets share requests, so a typical table edit is a single round-trip
+    edits = (
+        [('adds', feature) for feature in adds] +
+        [('updates', feature) for feature in updates] +
+        [('deletes', object_id) for object_id in delete_ids]
+    )
+    requests = []
+    for start in range(0, len(edits), batch_size):
+        kwargs = {}
+        for operation, edit in edits[start:start + batch_size]:
+            kwargs.setdefault(operation, []).append(edit)
+        if 'deletes' in kwargs:
+            kwargs['deletes'] = ",".join(map(str, kwargs['deletes']))
+        requests.append(kwargs)
+    
+    result_keys = {'added': 'addResults', 'updated': 'updateResults', 'deleted': 'deleteResults'}
+    counts = {'added': 0, 'updated': 0, 'deleted': 0, 'errors': []}
+    if not requests:
+        return counts
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requests))) as executor:
+        futures = [executor.submit(feature_layer.edit_features, **kwargs) for kwargs in requests]
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                counts['errors'].append(str(e))
+                continue
+            for operation, result_key in result_keys.items():
+                counts[operation] += sum(1 for item in result.get(result_key, []) if item.get('success'))
+    
+    return counts
+
+def diff_attribute_table(original_df, editor_state, key_field='OBJECTID'):
+    """Translate st.data_editor change tracking into added, deleted and modified rows"""
+    keys = original_df[key_field]
+    deleted_positions = set(editor_state.get('deleted_rows', []))
+    edited_rows = {
+        int(position): cells
+        for position, cells in editor_state.get('edited_rows', {}).items()
+        if int(position) not in deleted_positions and cells
+    }
+    
+    modified = []
+    if edited_rows:
+        # Drop cells that were edited back to their original value, comparing all edits in one pass
+        after = pd.DataFrame.from_dict(edited_rows, orient='index')
+        touched = pd.DataFrame.from_dict(
+            {position: {column: True for column in cells} for position, cells in edited_rows.items()},
+            orient='index'
+        ).reindex(index=after.index, columns=after.columns, fill_value=False).fillna(False).astype(bool)
+        before = original_df.iloc[after.index.tolist()][after.columns.tolist()].set_axis(after.index)
+        unchanged = after.eq(before) | (after.isna() & before.isna())
+        changed = touched & ~unchanged
+        
+        # Only the changed cells are sent back, keyed by the feature's object id
+        for position in changed.index[changed.any(axis=1)]:
+            cells = edited_rows[position]
+            modified.append({
+                key_field: int(keys.iloc[position]),
+                **{column: cells[column] for column in cells if changed.at[position, column]}
+            })
+    
+    return {
+        # New rows stay plain dicts; they are only ever sent back as feature attributes
+        'added': [
+            {column: value for column, value in row.items() if column != key_field}
+            for row in editor_state.get('added_rows', [])
+        ],
+        'deleted': keys.iloc[sorted(deleted_positions)].dropna().astype('int64').tolist(),
+        'modified': modified
+    }
+
+@st.fragment
+def attribute_table_editor(feature_layer, table_key):
+    """Editable attribute table; runs as its own fragment so cell edits only rerun the table"""
+    st.subheader("Attribute Table")
+    try:
+        # Query limited features once and keep the original for diffing on reruns
+        if table_key not in st.session_state:
+            # Only attributes are edited here, so skip transferring and parsing geometry
+            feature_set = feature_layer.query(
+                out_fields="*",
+                return_geometry=False,
+                result_record_count=100
+            )
+            df = feature_set.sdf if feature_set.features else pd.DataFrame()
+            
+            # Remove geometry column for display
+            st.session_state[table_key] = df.drop(columns=['SHAPE'] if 'SHAPE' in df.columns else [])
+            st.session_state[f"{table_key}_count"] = feature_layer.query(return_count_only=True)
+        
+        display_df = st.session_state[table_key]
+        
+        if display_df.empty:
+            st.info("No features found in this layer")
+        elif 'OBJECTID' in display_df.columns:
+            st.write(f"Showing first 100 records (Total: {st.session_state[f'{table_key}_count']})")
+            st.caption("Edit cells directly, or select rows and press Delete to remove features")
+            
+            # One editor widget for the whole table instead of per-row controls
+            st.data_editor(
+                display_df,
+                num_rows="dynamic",
+                disabled=['OBJECTID'],
+                use_container_width=True,
+                key=f"{table_key}_editor"
+            )
+            
+            changes = diff_attribute_table(display_df, st.session_state.get(f"{table_key}_editor", {}))
+            added_rows = changes['added']
+            deleted_ids = changes['deleted']
+            modified_rows = changes['modified']
+            
+            if added_rows or deleted_ids or modified_rows:
+                st.warning(f"Pending changes: {len(added_rows)} added, {len(modified_rows)} modified, {len(deleted_ids)} deleted")
+                
+                confirm_apply = st.checkbox("Confirm destructive operations")
+                
+                if confirm_apply and st.button("💾 Apply Changes", type="primary"):
+                    try:
+                        adds = [
+                            {"attributes": {k: (None if pd.isna(v) else v) for k, v in row.items()}}
+                            for row in added_rows
+                        ]
+                        updates = [
+                            {"attributes": {k: (None if pd.isna(v) else v) for k, v in row.items()}}
+                            for row in modified_rows
+                        ]
+                        counts = apply_edits_in_batches(feature_layer, adds=adds, updates=updates, delete_ids=deleted_ids)
+                        summary = (
+                            f"added {counts['added']}, updated {counts['updated']} "
+                            f"and deleted {counts['deleted']} features"
+                        )
+                        
+                        # The editor's edits are tracked by row position, so they must go with the table
+                        st.session_state.pop(table_key, None)
+                        st.session_state.pop(f"{table_key}_editor", None)
+                        st.session_state.pop(f"{table_key}_count", None)
+                        if counts['errors']:
+                            # Keep the message on screen; the table reloads from the layer on the next run
+                            st.error(f"Some edits failed ({summary} went through): " + "; ".join(counts['errors']))
+                        else:
+                            st.success(f"Successfully {summary}")
+                            st.rerun(scope="fragment")
+                    except Exception as e:
+                        st.error(f"Error applying changes: {str(e)}")
+            
+            # Many new rows at once: one text area instead of a widget per field
+            with st.popover("➕ Bulk add features"):
+                editable_fields = [column for column in display_df.columns if column != 'OBJECTID']
+                example = {field: "" for field in editable_fields[:3]}
+                wkt_example = WKT_EXAMPLES.get(feature_layer.properties.get('geometryType'))
+                if wkt_example:
+                    example['geometry'] = wkt_example
+                payload = st.text_area(
+                    "New features as a JSON list of attribute objects",
+                    placeholder=json.dumps([example]),
+                    help="An optional 'geometry' key takes WKT in the layer's coordinate system",
+                    key=f"{table_key}_bulk"
+                )
+                
+                if st.button("Add Features", key=f"{table_key}_bulk_add") and payload.strip():
+                    try:
+                        records = json.loads(payload)
+                        if isinstance(records, dict):
+                            records = [records]
+                        unknown = sorted({key for record in records for key in record} - set(editable_fields) - {'geometry'})
+                        if unknown:
+                            st.error(f"Unknown fields: {', '.join(unknown)}")
+                        else:
+                            import shapely
+                            from arcgis.geometry import Geometry
+                            
+                            # Parse every WKT string in one vectorized call; rows without one get no geometry
+                            wkt_strings = np.array([record.pop('geometry', None) for record in records], dtype=object)
+                            geometries = shapely.from_wkt(wkt_strings)
+                            adds = [
+                                {"attributes": record, "geometry": Geometry.from_shapely(geom)} if geom is not None
+                                else {"attributes": record}
+                                for record, geom in zip(records, geometries)
+                            ]
+                            counts = apply_edits_in_batches(feature_layer, adds=adds)
+                            st.session_state.pop(table_key, None)
+                            st.session_state.pop(f"{table_key}_editor", None)
+                            st.session_state.pop(f"{table_key}_count", None)
+                            if counts['errors']:
+                                st.error(
+                                    f"Added {counts['added']} of {len(records)} features; some requests failed: "
+                                    + "; ".join(counts['errors'])
+                                )
+                            else:
+                                st.success(f"Successfully added {counts['added']} of {len(records)} features")
+                                st.rerun(scope="fragment")
+                    except (ValueError, AttributeError) as e:
+                        st.error(f"Could not parse features: {str(e)}")
+                    except Exception as e:
+                        st.error(f"Error adding features: {str(e)}")
+        else:
+            st.dataframe(display_df, use_container_width=True)
+    except Exception as e:
+        st.error(f"Error loading attribute table: {str(e)}")
+
+@st.fragment
 def layer_editor():
     """Layer Editor section with styling, popup control, and data management"""
     st.header("🎨 Layer Editor")
@@ -1710,7 +2116,7 @@ def layer_editor():
     sublayers = []
     
     try:
-        layer_collection = FeatureLayerCollection.fromitem(selected_layer)
+        layer_collection = get_layer_collection(selected_layer.id, st.session_state.username, selected_layer)
         sublayers = layer_collection.layers
         
         with open("update_log.txt", "a") as log_file:
@@ -1725,7 +2131,8 @@ def layer_editor():
         with open("update_log.txt", "a") as log_file:
             log_file.write(f"[{datetime.now()}] Layer editor error: {str(e)}\n")
         return
-        
+    
+    try:
         # Sublayer selection
         if len(sublayers) > 1:
             sublayer_options = {}
@@ -1795,6 +2202,7 @@ def layer_editor():
                     if renderer:
                         definition = {"drawingInfo": {"renderer": renderer}}
                         feature_layer.manager.update_definition(definition)
+                        get_layer_collection.clear()
                         st.success("Symbology updated successfully!")
                     else:
                         st.error("Could not create renderer for this geometry type")
@@ -1821,6 +2229,7 @@ def layer_editor():
                         popup_info = create_popup_info(selected_fields) if selected_fields else None
                         definition = {"popupInfo": popup_info}
                         feature_layer.manager.update_definition(definition)
+                        get_layer_collection.clear()
                         st.success("Popup configuration updated successfully!")
                     except Exception as e:
                         st.error(f"Error updating popup settings: {str(e)}")
@@ -1829,6 +2238,7 @@ def layer_editor():
                     try:
                         definition = {"popupInfo": None}
                         feature_layer.manager.update_definition(definition)
+                        get_layer_collection.clear()
                         st.success("Popups disabled successfully!")
                     except Exception as e:
                         st.error(f"Error disabling popups: {str(e)}")
@@ -1838,57 +2248,8 @@ def layer_editor():
             st.warning("Data management operations cannot be undone. Use with caution.")
             
             # Show attribute table
-            st.subheader("Attribute Table")
-            try:
-                # Query limited features for performance
-                feature_set = feature_layer.query(return_count_only=False, result_record_count=100)
-                if feature_set.features:
-                    df = feature_set.sdf
-                    
-                    # Remove geometry column for display
-                    display_df = df.drop(columns=['SHAPE'] if 'SHAPE' in df.columns else [])
-                    
-                    # Add selection checkboxes
-                    if 'OBJECTID' in display_df.columns:
-                        st.write(f"Showing first 100 records (Total: {feature_layer.query(return_count_only=True)})")
-                        
-                        # Row selection
-                        selected_rows = st.multiselect(
-                            "Select rows to delete",
-                            options=display_df['OBJECTID'].tolist(),
-                            format_func=lambda x: f"OBJECTID: {x}",
-                            help="Select the Object IDs of features you want to delete"
-                        )
-                        
-                        # Display the data table
-                        st.dataframe(display_df, use_container_width=True)
-                        
-                        # Delete selected rows
-                        if selected_rows:
-                            st.warning(f"You have selected {len(selected_rows)} rows for deletion")
-                            
-                            confirm_delete = st.checkbox("I understand this will permanently delete the selected features")
-                            
-                            if confirm_delete and st.button("🗑️ Delete Selected Rows", type="primary"):
-                                try:
-                                    # Delete features by OBJECTID
-                                    where_clause = f"OBJECTID IN ({','.join(map(str, selected_rows))})"
-                                    delete_result = feature_layer.delete_features(where=where_clause)
-                                    
-                                    if delete_result.get('deleteResults'):
-                                        successful_deletes = sum(1 for result in delete_result['deleteResults'] if result.get('success'))
-                                        st.success(f"Successfully deleted {successful_deletes} features")
-                                        st.rerun()
-                                    else:
-                                        st.error("No features were deleted")
-                                except Exception as e:
-                                    st.error(f"Error deleting features: {str(e)}")
-                    else:
-                        st.dataframe(display_df, use_container_width=True)
-                else:
-                    st.info("No features found in this layer")
-            except Exception as e:
-                st.error(f"Error loading attribute table: {str(e)}")
+            table_key = f"attr_table_{selected_layer.id}_{getattr(layer_props, 'id', 0)}"
+            attribute_table_editor(feature_layer, table_key)
             
             # Delete entire layer
             st.subheader("Layer Management")
@@ -1907,6 +2268,7 @@ def layer_editor():
                         try:
                             result = selected_layer.delete()
                             if result:
+                                search_user_items.clear()
                                 st.success(f"Layer '{selected_layer.title}' has been deleted successfully")
                                 st.rerun()
                             else:
@@ -1955,10 +2317,9 @@ def main():
     
     # User info section
     if hasattr(st.session_state, 'gis'):
-        user = st.session_state.gis.users.me
         with st.sidebar.container():
-            st.write(f"**👤 User:** {user.username}")
-            st.write(f"**🔑 Role:** {user.role}")
+            st.write(f"**👤 User:** {st.session_state.username}")
+            st.write(f"**🔑 Role:** {st.session_state.get('user_role', 'Unknown')}")
             
             # Quick stats
             try:
@@ -1969,6 +2330,10 @@ def main():
             except:
                 pass
     
+    if st.sidebar.button("🔄 Refresh Content", help="Reload your layers and web maps from ArcGIS Online"):
+        search_user_items.clear()
+        st.rerun()
+    
     st.sidebar.markdown("---")
     
     # Page selection with enhanced descriptions
@@ -1984,11 +2349,15 @@ def main():
     # Logout button
     st.sidebar.markdown("---")
     if st.sidebar.button("🚪 Logout", help="Sign out and clear session"):
+        # Drop this login's cached connection so it can't be picked up after sign-out
+        if 'connection_key' in st.session_state:
+            connect_gis.clear(*st.session_state.connection_key, None)
         for key in list(st.session_state.keys()):
             del st.session_state[key]
         st.rerun()
     
-    # Display selected page with enhanced routing
+    # Display selected page with enhanced routing (each page is a fragment, so
+    # widget interactions inside a page rerun only that page, not the sidebar)
     if page == "View Layers":
         view_content()
     elif page == "Update Layer":
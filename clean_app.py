@@ -1,14 +1,16 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-from arcgis.gis import GIS
-from arcgis.features import FeatureLayer, FeatureLayerCollection
 import zipfile
 import tempfile
 import os
+import io
+import hashlib
 import shutil
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
+import orjson
+from utils.portal import search_user_items, query_feature_pages
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +20,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Sharing levels offered when publishing
+SHARING_LEVELS = ("private", "org", "public")
+
 def authenticate():
     """Handle ArcGIS Online authentication"""
     if 'authenticated' not in st.session_state:
@@ -36,11 +41,17 @@ def authenticate():
             if username and password:
                 try:
                     with st.spinner("Authenticating..."):
+                        # arcgis is only needed once the user actually logs in
+                        from arcgis.gis import GIS
+                        
                         gis = GIS("https://www.arcgis.com", username, password)
+                        # users.me is a portal request; resolve it once and keep what the UI needs
+                        user = gis.users.me
                         st.session_state.gis = gis
                         st.session_state.authenticated = True
-                        st.session_state.username = username
-                        st.success(f"Successfully authenticated as {gis.users.me.username}")
+                        st.session_state.username = user.username
+                        st.session_state.user_role = user.role
+                        st.success(f"Successfully authenticated as {user.username}")
                         st.rerun()
                 except Exception as e:
                     st.error(f"Authentication failed: {str(e)}")
@@ -54,12 +65,7 @@ def authenticate():
 def get_feature_layers():
     """Get user's existing feature layers"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + st.session_state.username,
-            item_type="Feature Service",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(st.session_state.username, "Feature Service", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving layers: {str(e)}")
         return []
@@ -67,12 +73,7 @@ def get_feature_layers():
 def get_web_maps():
     """Get user's existing web maps"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + st.session_state.username,
-            item_type="Web Map",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(st.session_state.username, "Web Map", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving web maps: {str(e)}")
         return []
@@ -101,32 +102,55 @@ def validate_zip_file(zip_file):
     except Exception as e:
         return False, f"Error reading zip file: {str(e)}"
 
-def extract_and_load_shapefile(zip_file):
-    """Extract zip file and load shapefile"""
+def upload_file_hash(uploaded_file, chunk_size=1 << 20):
+    """Content hash of an uploaded file, read in 1 MiB chunks"""
+    digest = hashlib.blake2b(digest_size=16)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(chunk_size), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+@st.cache_data(show_spinner=False, max_entries=32, ttl=3600)
+def validate_zip_cached(file_hash, _file_bytes):
+    """Validate an uploaded zip once per unique upload instead of on every rerun"""
+    return validate_zip_file(io.BytesIO(_file_bytes))
+
+# Only these members are needed to read a shapefile; anything else in the archive is skipped
+SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+def extract_and_load_shapefile(zip_file, upload_name="upload.zip"):
+    """
+    Copy the shapefile components into a flat upload zip and load the shapefile from it
+    Returns: (gdf, zip_path, temp_dir)
+    """
+    import geopandas as gpd
+
     temp_dir = tempfile.mkdtemp()
+    zip_path = os.path.join(temp_dir, upload_name)
     
     try:
-        # Extract zip file
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
+        # Stream members straight into the upload zip; nothing is extracted to disk first
+        shp_name = None
+        zip_file.seek(0)
+        with zipfile.ZipFile(zip_file, 'r') as source_zip, \
+                zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as upload_zip:
+            for info in source_zip.infolist():
+                member_name = os.path.basename(info.filename)
+                if info.is_dir() or not member_name.lower().endswith(SHAPEFILE_EXTENSIONS):
+                    continue
+                if shp_name is None and member_name.lower().endswith('.shp'):
+                    shp_name = member_name
+                with source_zip.open(info) as src, upload_zip.open(member_name, 'w') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
         
-        # Find shapefile
-        shp_file = None
-        for root, dirs, files in os.walk(temp_dir):
-            for file in files:
-                if file.lower().endswith('.shp'):
-                    shp_file = os.path.join(root, file)
-                    break
-            if shp_file:
-                break
-        
-        if not shp_file:
+        if not shp_name:
             raise Exception("No .shp file found in the archive")
         
-        # Load with geopandas
-        gdf = gpd.read_file(shp_file)
+        # Load with geopandas straight out of the archive
+        gdf = gpd.read_file(f"/vsizip/{zip_path}/{shp_name}", engine="pyogrio", use_arrow=True)
         
-        return gdf, temp_dir
+        return gdf, zip_path, temp_dir
     
     except Exception as e:
         # Clean up on error
@@ -143,25 +167,16 @@ def view_content():
     feature_layers = get_feature_layers()
     
     if feature_layers:
-        layer_data = []
-        for layer in feature_layers:
-            # Get FeatureServer URL
-            try:
-                layer_collection = FeatureLayerCollection.fromitem(layer)
-                feature_server_url = layer_collection.url
-            except:
-                feature_server_url = "URL not available"
-            
-            layer_data.append({
-                "Title": layer.title,
-                "ID": layer.id,
-                "Type": layer.type,
-                "Owner": layer.owner,
-                "Created": datetime.fromtimestamp(layer.created/1000).strftime('%Y-%m-%d'),
-                "FeatureServer URL": feature_server_url
-            })
-        
-        df = pd.DataFrame(layer_data)
+        # Everything shown comes back with the search results; the item's url is its FeatureServer URL,
+        # so no per-layer service request is needed
+        df = pd.DataFrame({
+            "Title": [layer.title for layer in feature_layers],
+            "ID": [layer.id for layer in feature_layers],
+            "Type": [layer.type for layer in feature_layers],
+            "Owner": [layer.owner for layer in feature_layers],
+            "Created": [datetime.fromtimestamp(layer.created / 1000).strftime('%Y-%m-%d') for layer in feature_layers],
+            "FeatureServer URL": [layer.url or "URL not available" for layer in feature_layers]
+        })
         st.dataframe(df, use_container_width=True)
         
         # Export functionality
@@ -197,6 +212,8 @@ def view_content():
 
 def update_existing_layer():
     """Update an existing feature layer"""
+    from arcgis.features import FeatureLayerCollection
+
     st.header("🔄 Update Existing Layer")
     
     feature_layers = get_feature_layers()
@@ -218,10 +235,9 @@ def update_existing_layer():
         # Display current layer info
         st.info(f"Selected: {selected_layer.title}")
         
-        try:
-            layer_collection = FeatureLayerCollection.fromitem(selected_layer)
-            st.code(f"FeatureServer URL: {layer_collection.url}")
-        except:
+        if selected_layer.url:
+            st.code(f"FeatureServer URL: {selected_layer.url}")
+        else:
             st.warning("Could not retrieve FeatureServer URL")
         
         # File upload
@@ -232,8 +248,8 @@ def update_existing_layer():
         )
         
         if uploaded_file:
-            # Validate zip file
-            is_valid, message = validate_zip_file(uploaded_file)
+            # Validate zip file (cached on content hash)
+            is_valid, message = validate_zip_cached(upload_file_hash(uploaded_file), uploaded_file.getvalue())
             
             if is_valid:
                 st.success(message)
@@ -242,16 +258,7 @@ def update_existing_layer():
                     try:
                         with st.spinner("Updating layer..."):
                             # Extract and load shapefile
-                            gdf, temp_dir = extract_and_load_shapefile(uploaded_file)
-                            
-                            # Create temporary zip for upload
-                            temp_zip_path = os.path.join(temp_dir, "update.zip")
-                            with zipfile.ZipFile(temp_zip_path, 'w') as zip_ref:
-                                for root, dirs, files in os.walk(temp_dir):
-                                    for file in files:
-                                        if not file.endswith('.zip'):
-                                            file_path = os.path.join(root, file)
-                                            zip_ref.write(file_path, file)
+                            gdf, temp_zip_path, temp_dir = extract_and_load_shapefile(uploaded_file, "update.zip")
                             
                             # Update layer
                             layer_collection = FeatureLayerCollection.fromitem(selected_layer)
@@ -289,7 +296,7 @@ def create_new_layer():
     
     with col2:
         layer_tags = st.text_input("Tags (comma-separated)", placeholder="tag1, tag2, tag3")
-        sharing_level = st.selectbox("Sharing Level", ["private", "org", "public"])
+        sharing_level = st.selectbox("Sharing Level", SHARING_LEVELS)
     
     # Web map selection
     web_maps = get_web_maps()
@@ -309,8 +316,8 @@ def create_new_layer():
     )
     
     if uploaded_file and layer_title:
-        # Validate zip file
-        is_valid, message = validate_zip_file(uploaded_file)
+        # Validate zip file (cached on content hash)
+        is_valid, message = validate_zip_cached(upload_file_hash(uploaded_file), uploaded_file.getvalue())
         
         if is_valid:
             st.success(message)
@@ -319,7 +326,7 @@ def create_new_layer():
                 try:
                     with st.spinner("Creating new layer..."):
                         # Extract and load shapefile
-                        gdf, temp_dir = extract_and_load_shapefile(uploaded_file)
+                        gdf, temp_zip_path, temp_dir = extract_and_load_shapefile(uploaded_file, "new_layer.zip")
                         
                         # Prepare item properties
                         item_properties = {
@@ -331,15 +338,6 @@ def create_new_layer():
                         if layer_description:
                             item_properties['description'] = layer_description
                         
-                        # Create temporary zip for upload
-                        temp_zip_path = os.path.join(temp_dir, "new_layer.zip")
-                        with zipfile.ZipFile(temp_zip_path, 'w') as zip_ref:
-                            for root, dirs, files in os.walk(temp_dir):
-                                for file in files:
-                                    if not file.endswith('.zip'):
-                                        file_path = os.path.join(root, file)
-                                        zip_ref.write(file_path, file)
-                        
                         # Add item to ArcGIS Online
                         item = st.session_state.gis.content.add(item_properties, temp_zip_path)
                         
@@ -352,44 +350,50 @@ def create_new_layer():
                         elif sharing_level == "public":
                             feature_service.share(everyone=True)
                         
-                        # Get FeatureServer URL
-                        layer_collection = FeatureLayerCollection.fromitem(feature_service)
-                        feature_server_url = layer_collection.url
+                        # The published item's url is the FeatureServer URL
+                        feature_server_url = feature_service.url
                         
+                        search_user_items.clear()
                         st.success("Layer created successfully!")
                         st.info(f"Records created: {len(gdf)}")
                         st.code(f"FeatureServer URL: {feature_server_url}")
                         
                         # Add to selected web maps
                         if web_maps and selected_maps:
-                            for map_key in selected_maps:
-                                try:
-                                    web_map = map_options[map_key]
-                                    web_map_item = st.session_state.gis.content.get(web_map.id)
-                                    
-                                    # Add layer to web map
-                                    web_map_obj = web_map_item.get_data()
-                                    
-                                    # Create layer definition
-                                    layer_def = {
-                                        "id": feature_service.id,
-                                        "title": layer_title,
-                                        "url": feature_server_url,
-                                        "visibility": True,
-                                        "opacity": 1
-                                    }
-                                    
-                                    # Add to operational layers
-                                    if 'operationalLayers' not in web_map_obj:
-                                        web_map_obj['operationalLayers'] = []
-                                    web_map_obj['operationalLayers'].append(layer_def)
-                                    
-                                    # Update web map
-                                    web_map_item.update(data=json.dumps(web_map_obj))
-                                    st.success(f"Added to web map: {web_map.title}")
-                                    
-                                except Exception as e:
-                                    st.warning(f"Could not add to web map {web_map.title}: {str(e)}")
+                            def add_to_web_map(web_map):
+                                """Append the new layer to one web map; runs in a worker thread"""
+                                web_map_obj = web_map.get_data()
+                                
+                                # Create layer definition
+                                layer_def = {
+                                    "id": feature_service.id,
+                                    "title": layer_title,
+                                    "url": feature_server_url,
+                                    "visibility": True,
+                                    "opacity": 1
+                                }
+                                
+                                # Add to operational layers
+                                if 'operationalLayers' not in web_map_obj:
+                                    web_map_obj['operationalLayers'] = []
+                                web_map_obj['operationalLayers'].append(layer_def)
+                                
+                                # Update web map
+                                web_map.update(data=orjson.dumps(web_map_obj).decode())
+                            
+                            # The search results are already the web map Items; update them concurrently
+                            with ThreadPoolExecutor(max_workers=min(4, len(selected_maps))) as executor:
+                                futures = {
+                                    executor.submit(add_to_web_map, map_options[map_key]): map_options[map_key]
+                                    for map_key in selected_maps
+                                }
+                                for future in as_completed(futures):
+                                    web_map = futures[future]
+                                    try:
+                                        future.result()
+                                        st.success(f"Added to web map: {web_map.title}")
+                                    except Exception as e:
+                                        st.warning(f"Could not add to web map {web_map.title}: {str(e)}")
                         
                         # Show sample data
                         st.subheader("Sample of created data")
@@ -407,6 +411,10 @@ def create_new_layer():
 
 def merge_layers():
     """Merge multiple feature layers"""
+    import geopandas as gpd
+    from arcgis.features import FeatureLayerCollection
+    from utils.geometry import sdf_to_geodataframe
+
     st.header("🔗 Merge Layers")
     
     feature_layers = get_feature_layers()
@@ -439,72 +447,69 @@ def merge_layers():
         
         with col2:
             merged_tags = st.text_input("Tags (comma-separated)", placeholder="tag1, tag2, tag3")
-            sharing_level = st.selectbox("Sharing Level", ["private", "org", "public"], key="merge_sharing")
+            sharing_level = st.selectbox("Sharing Level", SHARING_LEVELS, key="merge_sharing")
         
         if merged_title and st.button("Merge Layers", type="primary"):
             try:
                 with st.spinner("Merging layers..."):
                     merged_gdf = None
+                    layer_frames = []
                     total_records = 0
                     
-                    # Collect data from all selected layers
-                    for layer_key in selected_layers:
-                        layer = layer_options[layer_key]
+                    def fetch_layer_frame(layer):
+                        """Query every feature of a layer's first sublayer; runs in a worker thread"""
+                        feature_layer = FeatureLayerCollection.fromitem(layer).layers[0]
                         
+                        # Page through the layer so it isn't cut off at the server's maxRecordCount
+                        pages = query_feature_pages(feature_layer)
+                        if not pages:
+                            return None
+                        
+                        # Convert each page to a GeoDataFrame and combine them
+                        page_frames = []
+                        for page in pages:
+                            page_df = page.sdf
+                            page_frames.append(sdf_to_geodataframe(page_df) if 'SHAPE' in page_df.columns else page_df)
+                        layer_gdf = pd.concat(page_frames, ignore_index=True) if len(page_frames) > 1 else page_frames[0]
+                        
+                        # Add source layer information
+                        layer_gdf['source_layer'] = layer.title
+                        return layer_gdf
+                    
+                    # Collect data from all selected layers; the queries are independent, so overlap them
+                    selected = [layer_options[layer_key] for layer_key in selected_layers]
+                    with ThreadPoolExecutor(max_workers=min(4, len(selected))) as executor:
+                        futures = [executor.submit(fetch_layer_frame, layer) for layer in selected]
+                    
+                    # Report in selection order so the merged rows keep the layers' order
+                    for layer, future in zip(selected, futures):
                         try:
-                            # Get layer data
-                            layer_collection = FeatureLayerCollection.fromitem(layer)
-                            feature_layer = layer_collection.layers[0]
-                            
-                            # Query all features
-                            feature_set = feature_layer.query()
-                            
-                            if feature_set.features:
-                                # Convert to GeoDataFrame
-                                layer_gdf = feature_set.sdf
-                                
-                                if 'SHAPE' in layer_gdf.columns:
-                                    layer_gdf = layer_gdf.set_geometry('SHAPE')
-                                
-                                # Add source layer information
-                                layer_gdf['source_layer'] = layer.title
-                                
-                                # Merge with existing data
-                                if merged_gdf is None:
-                                    merged_gdf = layer_gdf
-                                else:
-                                    # Align columns
-                                    common_columns = list(set(merged_gdf.columns) & set(layer_gdf.columns))
-                                    merged_gdf = pd.concat([
-                                        merged_gdf[common_columns],
-                                        layer_gdf[common_columns]
-                                    ], ignore_index=True)
-                                
+                            layer_gdf = future.result()
+                            if layer_gdf is not None:
+                                layer_frames.append(layer_gdf)
                                 total_records += len(layer_gdf)
                                 st.info(f"Added {len(layer_gdf)} records from {layer.title}")
-                        
                         except Exception as e:
                             st.warning(f"Could not process layer {layer.title}: {str(e)}")
                     
+                    # Align on the columns shared by every layer (Index ops keep column order) and concatenate once
+                    if layer_frames:
+                        common_columns = layer_frames[0].columns
+                        for frame in layer_frames[1:]:
+                            common_columns = common_columns.intersection(frame.columns, sort=False)
+                        merged_gdf = pd.concat([frame[common_columns] for frame in layer_frames], ignore_index=True)
+                    
                     if merged_gdf is not None and len(merged_gdf) > 0:
                         # Save merged data to temporary shapefile
                         temp_dir = tempfile.mkdtemp()
-                        shapefile_path = os.path.join(temp_dir, "merged_layer.shp")
                         
                         # Convert to GeoDataFrame if needed
                         if not isinstance(merged_gdf, gpd.GeoDataFrame):
                             merged_gdf = gpd.GeoDataFrame(merged_gdf)
                         
-                        merged_gdf.to_file(shapefile_path)
-                        
-                        # Create zip file
-                        zip_path = os.path.join(temp_dir, "merged_layer.zip")
-                        with zipfile.ZipFile(zip_path, 'w') as zip_ref:
-                            for root, dirs, files in os.walk(temp_dir):
-                                for file in files:
-                                    if not file.endswith('.zip'):
-                                        file_path = os.path.join(root, file)
-                                        zip_ref.write(file_path, file)
+                        # GDAL writes the zipped shapefile directly (.shp.zip), no separate zip pass
+                        zip_path = os.path.join(temp_dir, "merged_layer.shp.zip")
+                        merged_gdf.to_file(zip_path, driver='ESRI Shapefile', engine='pyogrio', use_arrow=True)
                         
                         # Prepare item properties
                         item_properties = {
@@ -526,10 +531,10 @@ def merge_layers():
                         elif sharing_level == "public":
                             feature_service.share(everyone=True)
                         
-                        # Get FeatureServer URL
-                        layer_collection = FeatureLayerCollection.fromitem(feature_service)
-                        feature_server_url = layer_collection.url
+                        # The published item's url is the FeatureServer URL
+                        feature_server_url = feature_service.url
                         
+                        search_user_items.clear()
                         st.success("Layers merged successfully!")
                         st.info(f"Total records in merged layer: {len(merged_gdf)}")
                         st.code(f"FeatureServer URL: {feature_server_url}")
@@ -597,6 +602,7 @@ def delete_layer():
                         result = selected_layer.delete()
                         
                         if result:
+                            search_user_items.clear()
                             st.success(f"Layer '{selected_layer.title}' has been deleted successfully")
                         else:
                             st.error("Failed to delete the layer")
@@ -628,9 +634,8 @@ def main():
     
     # User info
     if hasattr(st.session_state, 'gis'):
-        user = st.session_state.gis.users.me
-        st.sidebar.write(f"**User:** {user.username}")
-        st.sidebar.write(f"**Role:** {user.role}")
+        st.sidebar.write(f"**User:** {st.session_state.username}")
+        st.sidebar.write(f"**Role:** {st.session_state.get('user_role', 'Unknown')}")
     
     st.sidebar.markdown("---")
     
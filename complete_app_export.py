@@ -25,14 +25,17 @@ import pandas as pd
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayerCollection
 from arcgis.mapping import WebMap
+from arcgis.geometry import Geometry
 import zipfile
 import os
 import json
 import tempfile
 import shutil
 from datetime import datetime
+from collections import deque
 import folium
 from streamlit_folium import st_folium
+from utils.portal import search_user_items, wait_for_item_indexed
 
 # Set page configuration
 st.set_page_config(
@@ -42,6 +45,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Sharing levels offered when publishing
+SHARING_LEVELS = ("private", "org", "public")
+
 def authenticate():
     """Handle ArcGIS Online authentication"""
     if 'authenticated' not in st.session_state:
@@ -62,10 +68,11 @@ def authenticate():
                 try:
                     with st.spinner("Authenticating..."):
                         gis = GIS("https://www.arcgis.com", username, password)
+                        user = gis.users.me
                         st.session_state.gis = gis
                         st.session_state.authenticated = True
-                        st.session_state.username = username
-                        st.success(f"Successfully authenticated as {gis.users.me.username}")
+                        st.session_state.username = user.username
+                        st.success(f"Successfully authenticated as {user.username}")
                         st.rerun()
                 except Exception as e:
                     st.error(f"Authentication failed: {str(e)}")
@@ -79,12 +86,7 @@ def authenticate():
 def get_feature_layers(username):
     """Get user's existing feature layers"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + username,
-            item_type="Feature Service",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(username, "Feature Service", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving layers: {str(e)}")
         return []
@@ -92,12 +94,7 @@ def get_feature_layers(username):
 def get_web_maps(username):
     """Get user's existing web maps"""
     try:
-        search_results = st.session_state.gis.content.search(
-            query="owner:" + username,
-            item_type="Web Map",
-            max_items=100
-        )
-        return search_results
+        return search_user_items(username, "Web Map", st.session_state.gis)
     except Exception as e:
         st.error(f"Error retrieving web maps: {str(e)}")
         return []
@@ -106,12 +103,13 @@ def validate_zip_file(zip_file):
     """Validate that zip file contains shapefile components"""
     try:
         with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
+            # Collect extensions in a single pass (case-insensitive)
+            suffixes = {os.path.splitext(name)[1].lower() for name in zip_ref.namelist()}
             
         # Check for required shapefile components
-        has_shp = any(f.endswith('.shp') for f in file_list)
-        has_shx = any(f.endswith('.shx') for f in file_list)
-        has_dbf = any(f.endswith('.dbf') for f in file_list)
+        has_shp = '.shp' in suffixes
+        has_shx = '.shx' in suffixes
+        has_dbf = '.dbf' in suffixes
         
         if not has_shp:
             return False, "No .shp file found in the zip archive"
@@ -163,7 +161,7 @@ def process_shapefile_upload(zip_file):
         
         # Read shapefile with GeoPandas
         try:
-            gdf = gpd.read_file(shp_path)
+            gdf = gpd.read_file(shp_path, engine="pyogrio", use_arrow=True)
             
             with open("update_log.txt", "a") as log_file:
                 log_file.write(f"[{datetime.now()}] Successfully read shapefile with GeoPandas\n")
@@ -195,8 +193,8 @@ def process_shapefile_upload(zip_file):
         field_names = [col for col in gdf.columns if col != 'geometry']
         
         # Ensure WGS84 coordinate system
-        if gdf.crs and gdf.crs.to_string() != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
+        if gdf.crs and not gdf.crs.equals(4326, ignore_axis_order=True):
+            gdf = gdf.to_crs(epsg=4326)
             with open("update_log.txt", "a") as log_file:
                 log_file.write(f"[{datetime.now()}] Reprojected to WGS84\n")
         
@@ -238,7 +236,7 @@ def create_new_layer():
             layer_tags = st.text_input("Tags (comma-separated)", placeholder="tag1, tag2, tag3")
         
         with col2:
-            sharing_level = st.selectbox("Sharing Level", ["private", "org", "public"])
+            sharing_level = st.selectbox("Sharing Level", SHARING_LEVELS)
             enable_styling = st.checkbox("Enable Custom Styling", value=True)
         
         # Styling options
@@ -328,28 +326,18 @@ def create_new_layer():
                     # Step 2: Direct layer creation bypassing CSV conversion
                     try:
                         with open("update_log.txt", "a") as log_file:
-                            log_file.write(f"[{datetime.now()}] Using direct shapefile upload method to bypass CSV issues\n")
+                            log_file.write(f"[{datetime.now()}] Using direct DataFrame publishing to bypass CSV issues\n")
                         
-                        # Create temporary directory for clean shapefile
-                        with tempfile.TemporaryDirectory() as temp_dir:
-                            # Copy processed shapefile to temp directory
-                            temp_shp_path = os.path.join(temp_dir, "temp_layer.shp")
-                            
-                            # Write GeoDataFrame as shapefile
-                            gdf.to_file(temp_shp_path, driver='ESRI Shapefile')
-                            
-                            with open("update_log.txt", "a") as log_file:
-                                log_file.write(f"[{datetime.now()}] Created temporary shapefile at {temp_shp_path}\n")
-                            
-                            # Upload shapefile directly to ArcGIS
-                            feature_service = st.session_state.gis.content.import_data(
-                                temp_shp_path,
-                                title=unique_title,
-                                tags=[tag.strip() for tag in layer_tags.split(',') if tag.strip()] if layer_tags else ["shapefile", "uploaded"]
-                            )
-                            
-                            with open("update_log.txt", "a") as log_file:
-                                log_file.write(f"[{datetime.now()}] Successfully uploaded using temporary shapefile method\n")
+                        # Publish straight from the data frame; no temporary shapefile on disk
+                        sdf = pd.DataFrame.spatial.from_geodataframe(gdf)
+                        feature_service = sdf.spatial.to_featurelayer(
+                            title=unique_title,
+                            gis=st.session_state.gis,
+                            tags=", ".join(tag.strip() for tag in layer_tags.split(',') if tag.strip()) if layer_tags else "shapefile, uploaded"
+                        )
+                        
+                        with open("update_log.txt", "a") as log_file:
+                            log_file.write(f"[{datetime.now()}] Successfully published from spatially enabled DataFrame\n")
                         
                         # Verify the service was created
                         if feature_service and hasattr(feature_service, 'id'):
@@ -360,7 +348,7 @@ def create_new_layer():
                             raise Exception("Layer creation returned invalid result")
                             
                         with open("update_log.txt", "a") as log_file:
-                            log_file.write(f"[{datetime.now()}] Published layer using direct shapefile upload method\n")
+                            log_file.write(f"[{datetime.now()}] Published layer using direct DataFrame publishing\n")
                             
                     except Exception as primary_error:
                         # Enhanced fallback using safe data handling
@@ -372,16 +360,11 @@ def create_new_layer():
                             with open("update_log.txt", "a") as log_file:
                                 log_file.write(f"[{datetime.now()}] Attempting CSV-compatible layer creation\n")
                             
-                            # Convert GeoDataFrame to CSV-compatible format
-                            df_for_csv = gdf.copy()
-                            
-                            # Convert geometry to WKT
-                            if 'geometry' in df_for_csv.columns:
-                                df_for_csv['wkt_geometry'] = df_for_csv['geometry'].to_wkt()
-                                df_for_csv = df_for_csv.drop(columns=['geometry'])
-                            
-                            # Convert to pandas DataFrame
-                            df_clean = pd.DataFrame(df_for_csv)
+                            # Convert GeoDataFrame to CSV-compatible format: drop() already returns a new frame,
+                            # so the geometry is written once as vectorized WKT without copying the whole GeoDataFrame
+                            df_clean = pd.DataFrame(gdf.drop(columns=['geometry'], errors='ignore'))
+                            if 'geometry' in gdf.columns:
+                                df_clean['wkt_geometry'] = gdf.geometry.to_wkt()
                             
                             # Create temporary CSV file
                             with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False) as tmp_file:
@@ -405,37 +388,30 @@ def create_new_layer():
                             with open("update_log.txt", "a") as log_file:
                                 log_file.write(f"[{datetime.now()}] CSV method failed: {str(csv_error)}, using minimal fallback\n")
                             
-                            # Create simplified features with only basic attributes
-                            features = []
-                            for idx, row in gdf.iterrows():
-                                try:
-                                    geom = row.geometry
-                                    if geom is not None and hasattr(geom, '__geo_interface__'):
-                                        geom_dict = geom.__geo_interface__
-                                        
-                                        # Create minimal attributes (avoid complex data types)
-                                        attributes = {'OBJECTID': idx + 1}
-                                        
-                                        # Only add string/numeric fields
-                                        for field in field_names:
-                                            try:
-                                                value = row[field]
-                                                if pd.notna(value):
-                                                    # Convert to string to avoid type issues
-                                                    attributes[field] = str(value)[:255]
-                                            except:
-                                                # Skip problematic fields
-                                                continue
-                                        
-                                        features.append({
-                                            'geometry': geom_dict,
-                                            'attributes': attributes
-                                        })
-                                except Exception as feature_error:
-                                    # Skip problematic features
-                                    with open("update_log.txt", "a") as log_file:
-                                        log_file.write(f"[{datetime.now()}] Skipping feature {idx}: {str(feature_error)}\n")
-                                    continue
+                            # Create simplified features with only basic attributes,
+                            # converting each attribute column in one pass rather than cell by cell
+                            valid_gdf = gdf[gdf.geometry.notna()]
+                            skipped = len(gdf) - len(valid_gdf)
+                            if skipped:
+                                with open("update_log.txt", "a") as log_file:
+                                    log_file.write(f"[{datetime.now()}] Skipping {skipped} features without geometry\n")
+                            
+                            # Only add non-null fields, converted to string to avoid type issues
+                            attribute_columns = {}
+                            for field in field_names:
+                                if field in valid_gdf.columns:
+                                    values = valid_gdf[field]
+                                    attribute_columns[field] = values.astype(str).str.slice(0, 255).astype(object).where(values.notna(), None)
+                            attribute_df = pd.DataFrame(attribute_columns, index=valid_gdf.index)
+                            attribute_df.insert(0, 'OBJECTID', valid_gdf.index + 1)
+                            
+                            features = [
+                                {
+                                    'geometry': Geometry.from_shapely(geom, {'wkid': 4326}),
+                                    'attributes': {k: v for k, v in attributes.items() if v is not None}
+                                }
+                                for geom, attributes in zip(valid_gdf.geometry.values, attribute_df.to_dict('records'))
+                            ]
                             
                             if not features:
                                 raise Exception("No valid features could be created from the shapefile")
@@ -536,6 +512,7 @@ def create_new_layer():
                     # Verify layer is accessible in portal
                     portal_link = f"https://www.arcgis.com/home/item.html?id={feature_service.id}"
                     
+                    search_user_items.clear()
                     st.success("Layer created successfully with custom styling!")
                     st.markdown(f"**🔗 View in ArcGIS Online:** [Open Layer in Portal]({portal_link})")
                     st.info(f"Records created: {len(gdf)}")
@@ -543,16 +520,8 @@ def create_new_layer():
                     
                     # Verify layer appears in user's content
                     try:
-                        import time
-                        time.sleep(3)  # Allow portal indexing time
-                        
-                        # Search for the newly created layer
-                        search_results = st.session_state.gis.content.search(
-                            query=f"id:{feature_service.id}",
-                            max_items=1
-                        )
-                        
-                        if search_results:
+                        # Return as soon as the portal has indexed the item instead of always waiting
+                        if wait_for_item_indexed(st.session_state.gis, feature_service.id):
                             st.info("✅ Layer verified and available in your ArcGIS Online portal")
                             with open("update_log.txt", "a") as log_file:
                                 log_file.write(f"[{datetime.now()}] Layer successfully verified in portal\n")
@@ -855,10 +824,10 @@ def main():
         # Show recent logs
         if os.path.exists("update_log.txt"):
             with open("update_log.txt", "r") as log_file:
-                logs = log_file.readlines()
+                logs = deque(log_file, maxlen=5)  # Keep only the last 5 log entries
                 if logs:
                     st.sidebar.subheader("Recent Logs")
-                    for log in logs[-5:]:  # Show last 5 log entries
+                    for log in logs:
                         st.sidebar.text(log.strip())
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import io
 from datetime import datetime
 
 def safe_dataframe_conversion(data, operation_name="operation"):
@@ -63,7 +64,7 @@ def safe_csv_export(data, filename=None, operation_name="CSV export"):
         filename: Optional filename
         operation_name: Name of operation for error reporting
     Returns:
-        (success, csv_string, error_message)
+        (success, csv_bytes, error_message)
     """
     try:
         # Convert to DataFrame if needed
@@ -71,14 +72,17 @@ def safe_csv_export(data, filename=None, operation_name="CSV export"):
         if not success:
             return False, None, error
         
-        # Generate CSV string
-        csv_string = df.to_csv(index=False)
+        # Render the CSV once; the same bytes feed the download and the optional file
+        buffer = io.BytesIO()
+        df.to_csv(buffer, index=False, encoding='utf-8')
+        csv_bytes = buffer.getvalue()
         
         # Optionally save to file
         if filename:
-            df.to_csv(filename, index=False)
+            with open(filename, 'wb') as f:
+                f.write(csv_bytes)
             
-        return True, csv_string, None
+        return True, csv_bytes, None
         
     except Exception as e:
         return False, None, f"Error during {operation_name}: {str(e)}"
@@ -1,10 +1,13 @@
 import streamlit as st
 import os
+import shutil
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayerCollection
 import pandas as pd
+from utils.portal import search_user_items
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +21,10 @@ if 'gis' not in st.session_state:
     st.session_state.gis = None
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
+if 'username' not in st.session_state:
+    st.session_state.username = None
+if 'user_fullname' not in st.session_state:
+    st.session_state.user_fullname = None
 
 def authenticate():
     """Handle ArcGIS Online authentication"""
@@ -40,6 +47,8 @@ def authenticate():
                         if user:
                             st.session_state.gis = gis
                             st.session_state.authenticated = True
+                            st.session_state.username = user.username
+                            st.session_state.user_fullname = user.fullName
                             st.success(f"Successfully authenticated as {user.fullName}")
                             st.rerun()
                         else:
@@ -52,12 +61,7 @@ def authenticate():
 def get_feature_layers():
     """Get user's existing feature layers"""
     try:
-        items = st.session_state.gis.content.search(
-            query=f"owner:{st.session_state.gis.users.me.username}",
-            item_type="Feature Service",
-            max_items=100
-        )
-        return items
+        return search_user_items(st.session_state.username, "Feature Service", st.session_state.gis)
     except Exception as e:
         st.error(f"Error fetching feature layers: {str(e)}")
         return []
@@ -65,41 +69,50 @@ def get_feature_layers():
 def get_web_maps():
     """Get user's existing web maps"""
     try:
-        items = st.session_state.gis.content.search(
-            query=f"owner:{st.session_state.gis.users.me.username}",
-            item_type="Web Map",
-            max_items=100
-        )
-        return items
+        return search_user_items(st.session_state.username, "Web Map", st.session_state.gis)
     except Exception as e:
         st.error(f"Error fetching web maps: {str(e)}")
         return []
 
+REQUIRED_SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf')
+
 def validate_zip_file(zip_file):
     """Validate that zip file contains shapefile components"""
     try:
         with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            file_list = zip_ref.namelist()
+            # Collect extensions in a single pass (case-insensitive)
+            extensions = {os.path.splitext(name)[1].lower() for name in zip_ref.namelist()}
             
             # Check for required shapefile components
-            has_shp = any(f.endswith('.shp') for f in file_list)
-            has_shx = any(f.endswith('.shx') for f in file_list)
-            has_dbf = any(f.endswith('.dbf') for f in file_list)
-            
-            if has_shp and has_shx and has_dbf:
+            missing = [ext for ext in REQUIRED_SHAPEFILE_EXTENSIONS if ext not in extensions]
+            if not missing:
                 return True, "Valid shapefile archive"
-            else:
-                missing = []
-                if not has_shp: missing.append('.shp')
-                if not has_shx: missing.append('.shx')
-                if not has_dbf: missing.append('.dbf')
-                return False, f"Missing required files: {', '.join(missing)}"
+            return False, f"Missing required files: {', '.join(missing)}"
                 
     except zipfile.BadZipFile:
         return False, "Invalid zip file format"
     except Exception as e:
         return False, f"Error validating zip file: {str(e)}"
 
+@st.cache_resource
+def cleanup_executor():
+    """Single background worker shared across sessions for item cleanup"""
+    return ThreadPoolExecutor(max_workers=1)
+
+def report_pending_cleanups():
+    """Report background item deletions that failed; ones still running are checked again next run"""
+    pending = []
+    for future, item_title in st.session_state.get('pending_cleanups', []):
+        if not future.done():
+            pending.append((future, item_title))
+        elif future.exception():
+            st.warning(f"Could not delete the uploaded zip item '{item_title}': {future.exception()}. "
+                       "Remove it from your content manually.")
+    st.session_state.pending_cleanups = pending
+
+# Sharing levels offered when publishing
+SHARING_LEVELS = ("Private", "Organization", "Public")
+
 def apply_sharing_settings(item, sharing_level):
     """Apply sharing settings to an item"""
     try:
@@ -145,7 +158,7 @@ def update_existing_layer():
         # Sharing level
         sharing_level = st.radio(
             "Sharing Level",
-            options=["Private", "Organization", "Public"],
+            options=SHARING_LEVELS,
             help="Set the sharing level for the updated layer"
         )
         
@@ -166,8 +179,9 @@ def update_existing_layer():
                         # Save uploaded file to temporary location
                         with tempfile.TemporaryDirectory() as temp_dir:
                             temp_zip_path = os.path.join(temp_dir, "update.zip")
+                            uploaded_file.seek(0)
                             with open(temp_zip_path, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
+                                shutil.copyfileobj(uploaded_file, f, length=65536)
                             
                             # Get the feature layer collection
                             flc = FeatureLayerCollection.fromitem(selected_layer)
@@ -176,6 +190,8 @@ def update_existing_layer():
                             result = flc.manager.overwrite(temp_zip_path)
                             
                             if result:
+                                search_user_items.clear()
+                                
                                 # Apply sharing settings
                                 apply_sharing_settings(selected_layer, sharing_level)
                                 
@@ -224,16 +240,18 @@ def create_new_layer():
         # Sharing level
         sharing_level = st.radio(
             "Sharing Level",
-            options=["Private", "Organization", "Public"],
+            options=SHARING_LEVELS,
             help="Set the sharing level for the new layer"
         )
         
         # Web maps selection
-        web_maps = get_web_maps()
+        web_maps = {wm.id: wm for wm in get_web_maps()}
         if web_maps:
+            # Options are item ids so nothing has to be parsed back out of the label on submit
             selected_maps = st.multiselect(
                 "Add to Web Maps (Optional)",
-                options=[f"{wm.title} ({wm.id})" for wm in web_maps],
+                options=list(web_maps),
+                format_func=lambda map_id: f"{web_maps[map_id].title} ({map_id})",
                 help="Select web maps to add this new layer to"
             )
         else:
@@ -255,8 +273,9 @@ def create_new_layer():
                         # Save uploaded file to temporary location
                         with tempfile.TemporaryDirectory() as temp_dir:
                             temp_zip_path = os.path.join(temp_dir, "new_layer.zip")
+                            uploaded_file.seek(0)
                             with open(temp_zip_path, "wb") as f:
-                                f.write(uploaded_file.getbuffer())
+                                shutil.copyfileobj(uploaded_file, f, length=65536)
                             
                             # Add the zip file as an item
                             zip_item = st.session_state.gis.content.add({
@@ -267,28 +286,40 @@ def create_new_layer():
                             # Publish as feature layer
                             feature_layer = zip_item.publish()
                             
+                            # The uploaded zip item is no longer needed; delete it off the critical path
+                            st.session_state.setdefault('pending_cleanups', []).append(
+                                (cleanup_executor().submit(zip_item.delete), zip_item.title)
+                            )
+                            search_user_items.clear()
+                            
                             # Apply sharing settings
                             apply_sharing_settings(feature_layer, sharing_level)
                             
                             # Add to web maps if selected
                             if selected_maps:
-                                for map_title in selected_maps:
-                                    map_id = map_title.split('(')[-1].replace(')', '')
-                                    try:
-                                        web_map = st.session_state.gis.content.get(map_id)
-                                        # Add layer to web map
-                                        web_map_obj = web_map.get_data()
-                                        web_map_obj['operationalLayers'].append({
-                                            'id': feature_layer.id,
-                                            'title': feature_layer.title,
-                                            'url': feature_layer.url,
-                                            'layerType': 'ArcGISFeatureLayer',
-                                            'visibility': True
-                                        })
-                                        web_map.update(data=web_map_obj)
-                                        st.success(f"Added to web map: {web_map.title}")
-                                    except Exception as e:
-                                        st.warning(f"Could not add to web map {map_title}: {str(e)}")
+                                def add_to_web_map(map_id):
+                                    """Add the new layer to one web map; runs in a worker thread"""
+                                    web_map = web_maps[map_id]
+                                    # Add layer to web map
+                                    web_map_obj = web_map.get_data()
+                                    web_map_obj['operationalLayers'].append({
+                                        'id': feature_layer.id,
+                                        'title': feature_layer.title,
+                                        'url': feature_layer.url,
+                                        'layerType': 'ArcGISFeatureLayer',
+                                        'visibility': True
+                                    })
+                                    web_map.update(data=web_map_obj)
+                                    return web_map.title
+                                
+                                # Each web map update is independent, so run them concurrently
+                                with ThreadPoolExecutor(max_workers=min(4, len(selected_maps))) as executor:
+                                    futures = {executor.submit(add_to_web_map, map_id): map_id for map_id in selected_maps}
+                                    for future in as_completed(futures):
+                                        try:
+                                            st.success(f"Added to web map: {future.result()}")
+                                        except Exception as e:
+                                            st.warning(f"Could not add to web map {web_maps[futures[future]].title}: {str(e)}")
                             
                             st.success("✅ New layer created successfully!")
                             st.info(f"**FeatureServer URL:** {feature_layer.url}")
@@ -305,8 +336,8 @@ def create_new_layer():
                                 st.write(f"**Created:** {feature_layer.created}")
                                 st.write(f"**ID:** {feature_layer.id}")
                             
-                            # Clean up the temporary zip item
-                            zip_item.delete()
+                            # Surface the cleanup now if it has already failed; otherwise on a later run
+                            report_pending_cleanups()
                             
                 except Exception as e:
                     st.error(f"Error creating layer: {str(e)}")
@@ -324,13 +355,15 @@ def view_content():
         feature_layers = get_feature_layers()
         
         if feature_layers:
-            for layer in feature_layers:
-                with st.expander(f"📊 {layer.title}"):
-                    st.write(f"**Type:** {layer.type}")
-                    st.write(f"**Owner:** {layer.owner}")
-                    st.write(f"**Modified:** {layer.modified}")
-                    st.write(f"**URL:** {layer.url}")
-                    st.write(f"**ID:** {layer.id}")
+            # One table widget for all layers rather than an expander per item
+            st.dataframe(pd.DataFrame({
+                "Title": [layer.title for layer in feature_layers],
+                "Type": [layer.type for layer in feature_layers],
+                "Owner": [layer.owner for layer in feature_layers],
+                "Modified": pd.to_datetime([layer.modified for layer in feature_layers], unit='ms'),
+                "URL": [layer.url for layer in feature_layers],
+                "ID": [layer.id for layer in feature_layers]
+            }), use_container_width=True, hide_index=True)
         else:
             st.info("No feature layers found")
     
@@ -339,12 +372,13 @@ def view_content():
         web_maps = get_web_maps()
         
         if web_maps:
-            for web_map in web_maps:
-                with st.expander(f"🗺️ {web_map.title}"):
-                    st.write(f"**Type:** {web_map.type}")
-                    st.write(f"**Owner:** {web_map.owner}")
-                    st.write(f"**Modified:** {web_map.modified}")
-                    st.write(f"**ID:** {web_map.id}")
+            st.dataframe(pd.DataFrame({
+                "Title": [web_map.title for web_map in web_maps],
+                "Type": [web_map.type for web_map in web_maps],
+                "Owner": [web_map.owner for web_map in web_maps],
+                "Modified": pd.to_datetime([web_map.modified for web_map in web_maps], unit='ms'),
+                "ID": [web_map.id for web_map in web_maps]
+            }), use_container_width=True, hide_index=True)
         else:
             st.info("No web maps found")
 
@@ -360,18 +394,22 @@ def main():
     
     # Display user info
     try:
-        user = st.session_state.gis.users.me
-        st.sidebar.success(f"Logged in as: **{user.fullName}**")
+        st.sidebar.success(f"Logged in as: **{st.session_state.user_fullname}**")
         st.sidebar.info(f"Organization: {st.session_state.gis.properties.name}")
         
         if st.sidebar.button("Logout"):
             st.session_state.gis = None
             st.session_state.authenticated = False
+            st.session_state.username = None
+            st.session_state.user_fullname = None
             st.rerun()
     except:
         st.session_state.authenticated = False
         st.rerun()
     
+    # Zip cleanups that were still running when their page last rendered
+    report_pending_cleanups()
+    
     # Navigation
     st.sidebar.header("Navigation")
     page = st.sidebar.selectbox(
@@ -16,6 +16,7 @@ import os
 import logging
 import shutil
 from datetime import datetime
+from collections import deque
 
 # Configure logging
 logging.basicConfig(filename='app_log.txt', level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -76,7 +77,7 @@ else:
             logging.info(f"Found shapefile: {shp_file}")
             
             # Step 3: Load with GeoPandas
-            gdf = gpd.read_file(shp_path)
+            gdf = gpd.read_file(shp_path, engine="pyogrio", use_arrow=True)
             logging.info(f"Loaded data - type: {type(gdf)}, shape: {gdf.shape}")
             
             # Validate GeoDataFrame
@@ -91,17 +92,13 @@ else:
                 st.write(f"- Type: {type(gdf)}")
                 st.write(f"- Shape: {gdf.shape}")
                 st.write(f"- Columns: {list(gdf.columns)}")
-                st.dataframe(gdf.head())
+                st.dataframe(gdf.head().drop(columns=['geometry'], errors='ignore'))
             
             # Step 4: Convert geometry to WKT for CSV compatibility
             # (But we won't actually use CSV - this is for future compatibility)
-            gdf_copy = gdf.copy()
-            gdf_copy['wkt_geometry'] = gdf_copy['geometry'].apply(
-                lambda geom: geom.wkt if geom and hasattr(geom, 'wkt') else None
-            )
-            
-            # Create standard DataFrame (drop geometry column)
-            df = pd.DataFrame(gdf_copy.drop(columns=['geometry']))
+            # Create standard DataFrame (drop geometry column), serializing WKT in one vectorized pass
+            df = pd.DataFrame(gdf.drop(columns=['geometry']))
+            df['wkt_geometry'] = gdf.geometry.to_wkt()
             logging.info(f"Created DataFrame - type: {type(df)}, shape: {df.shape}")
             
             # Critical validation
@@ -187,8 +184,8 @@ else:
                 if os.path.exists('app_log.txt'):
                     st.write("📄 Recent logs:")
                     with open('app_log.txt', 'r') as log_file:
-                        logs = log_file.readlines()
-                        for log in logs[-10:]:  # Last 10 entries
+                        logs = deque(log_file, maxlen=10)  # Last 10 entries
+                        for log in logs:
                             st.text(log.strip())
         
         finally:
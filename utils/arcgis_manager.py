@@ -1,12 +1,55 @@
-import os
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayer, FeatureSet
 import geopandas as gpd
 import pandas as pd
+import shapely
+from shapely.geometry.polygon import orient
 from typing import Dict, List, Any, Optional
-import tempfile
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.geometry import sdf_to_geodataframe
+from utils.portal import query_feature_pages
+
+def _coords(geom) -> List[List[float]]:
+    """Coordinates of a single-part geometry or ring as a list of [x, y(, z)] lists"""
+    return shapely.get_coordinates(geom, include_z=geom.has_z).tolist()
+
+def shapely_to_esri_geometry(geom, spatial_reference: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Convert a shapely geometry straight to an Esri JSON geometry dict
+    
+    Args:
+        geom: Shapely geometry
+        spatial_reference: Optional Esri spatialReference dict to attach
+        
+    Returns:
+        Dict in ArcGIS REST geometry format
+    """
+    geom_type = geom.geom_type
+    if geom_type == 'Point':
+        esri_geometry = {'x': geom.x, 'y': geom.y}
+    elif geom_type == 'MultiPoint':
+        esri_geometry = {'points': [[point.x, point.y] for point in geom.geoms]}
+    elif geom_type == 'LineString':
+        esri_geometry = {'paths': [_coords(geom)]}
+    elif geom_type == 'MultiLineString':
+        esri_geometry = {'paths': [_coords(line) for line in geom.geoms]}
+    elif geom_type in ('Polygon', 'MultiPolygon'):
+        # Esri rings: outer rings clockwise, holes counter-clockwise
+        polygons = geom.geoms if geom_type == 'MultiPolygon' else [geom]
+        rings = []
+        for polygon in polygons:
+            polygon = orient(polygon, sign=-1.0)
+            rings.append(_coords(polygon.exterior))
+            rings.extend(_coords(interior) for interior in polygon.interiors)
+        esri_geometry = {'rings': rings}
+    else:
+        raise ValueError(f"Unsupported geometry type: {geom_type}")
+    
+    if spatial_reference:
+        esri_geometry['spatialReference'] = spatial_reference
+    return esri_geometry
 
 class ArcGISManager:
     """Manages ArcGIS Online operations"""
@@ -17,6 +60,8 @@ class ArcGISManager:
         self.portal_url = portal_url
         self.gis = None
         self.authenticated = False
+        self.cache_ttl = 300
+        self._cache = {}
     
     def authenticate(self) -> bool:
         """
@@ -48,6 +93,21 @@ class ArcGISManager:
         
         return False
     
+    def _get_cached(self, key):
+        """Return a cached value if it is still fresh, otherwise None"""
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < self.cache_ttl:
+            return entry[1]
+        return None
+    
+    def _set_cached(self, key, value):
+        """Store a value in the lookup cache"""
+        self._cache[key] = (time.monotonic(), value)
+    
+    def clear_cache(self):
+        """Drop cached layer listings and schemas (e.g. for a Refresh button)"""
+        self._cache.clear()
+    
     def get_user_layers(self) -> List[Dict[str, Any]]:
         """
         Get list of user's feature layers
@@ -58,6 +118,10 @@ class ArcGISManager:
         if not self.authenticated:
             raise Exception("Not authenticated")
         
+        cached = self._get_cached(('user_layers', self.username, self.portal_url))
+        if cached is not None:
+            return list(cached)
+        
         try:
             layers = []
             
@@ -93,7 +157,8 @@ class ArcGISManager:
                     # Skip layers that can't be accessed
                     continue
             
-            return layers
+            self._set_cached(('user_layers', self.username, self.portal_url), layers)
+            return list(layers)
             
         except Exception as e:
             raise Exception(f"Error fetching user layers: {str(e)}")
@@ -111,6 +176,10 @@ class ArcGISManager:
         if not self.authenticated:
             raise Exception("Not authenticated")
         
+        cached = self._get_cached(('layer_schema', layer_id))
+        if cached is not None:
+            return list(cached)
+        
         try:
             # Get the item
             item = self.gis.content.get(layer_id)
@@ -134,20 +203,24 @@ class ArcGISManager:
                     }
                     fields.append(field_info)
                 
-                return fields
+                self._set_cached(('layer_schema', layer_id), fields)
+                return list(fields)
             else:
                 raise Exception("No layers found in feature service")
                 
         except Exception as e:
             raise Exception(f"Error getting layer schema: {str(e)}")
     
-    def get_layer_data(self, layer_id: str, max_records: int = 1000) -> gpd.GeoDataFrame:
+    def get_layer_data(self, layer_id: str, max_records: int = 1000, out_fields: str = "*",
+                       return_geometry: bool = True) -> gpd.GeoDataFrame:
         """
         Get data from a feature layer
         
         Args:
             layer_id: ArcGIS Online item ID
             max_records: Maximum number of records to retrieve
+            out_fields: Comma-separated field names to fetch ("*" for all)
+            return_geometry: Whether to fetch geometry; turn off for attribute-only listings
             
         Returns:
             GeoDataFrame containing layer data
@@ -168,16 +241,16 @@ class ArcGISManager:
                 # Query features
                 feature_set = layer.query(
                     where="1=1",
-                    out_fields="*",
-                    return_geometry=True,
+                    out_fields=out_fields,
+                    return_geometry=return_geometry,
                     result_record_count=max_records
                 )
                 
                 # Convert to GeoDataFrame
                 if feature_set.features:
                     # Convert features to GeoDataFrame
-                    gdf = feature_set.sdf
-                    return gdf
+                    df = feature_set.sdf
+                    return sdf_to_geodataframe(df) if 'SHAPE' in df.columns else df
                 else:
                     # Return empty GeoDataFrame with correct schema
                     fields = self.get_layer_schema(layer_id)
@@ -190,7 +263,8 @@ class ArcGISManager:
         except Exception as e:
             raise Exception(f"Error getting layer data: {str(e)}")
     
-    def update_layer(self, layer_id: str, data: gpd.GeoDataFrame, layer_title: str) -> Dict[str, Any]:
+    def update_layer(self, layer_id: str, data: gpd.GeoDataFrame, layer_title: str,
+                     batch_size: int = 1000, max_parallel_batches: int = 4) -> Dict[str, Any]:
         """
         Update feature layer with new data
         
@@ -198,6 +272,8 @@ class ArcGISManager:
             layer_id: ArcGIS Online item ID
             data: GeoDataFrame containing new data
             layer_title: Layer title for logging
+            batch_size: Number of features sent per applyEdits request
+            max_parallel_batches: Maximum number of batches in flight at once
             
         Returns:
             Dict containing operation results
@@ -226,91 +302,83 @@ class ArcGISManager:
             # Prepare data for upload
             # Convert GeoDataFrame to feature set format
             try:
-                # Create temporary shapefile
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    temp_shp = os.path.join(temp_dir, "temp_data.shp")
-                    
-                    # Ensure CRS is set (default to WGS84 if missing)
-                    if data.crs is None:
-                        data = data.set_crs('EPSG:4326')
-                    
-                    # Write to shapefile
-                    data.to_file(temp_shp)
-                    
-                    # Create feature collection from shapefile
-                    feature_collection = {
-                        "type": "FeatureCollection",
-                        "features": []
+                # Ensure CRS is set (default to WGS84 if missing)
+                if data.crs is None:
+                    data = data.set_crs('EPSG:4326')
+                
+                # Convert rows to Esri JSON features in memory
+                features = self._build_features(data)
+                
+                # Snapshot the current features so the layer can be put back if any add batch fails;
+                # paged, since a single query stops at the server's maxRecordCount
+                original_count = layer.query(where="1=1", return_count_only=True)
+                snapshot = [feature.as_dict for page in query_feature_pages(layer) for feature in page.features]
+                if len(snapshot) != original_count:
+                    return {
+                        'success': False,
+                        'error': (f"Could only snapshot {len(snapshot)} of {original_count} existing features; "
+                                  "layer left unchanged")
                     }
+                
+                # Overwrite layer data
+                # First, delete all existing features; skip the per-feature result list,
+                # which echoes every deleted object id back (and is empty for an empty layer)
+                delete_result = layer.delete_features(where="1=1", return_delete_results=False)
+                
+                if delete_result.get('success'):
+                    # Add new features in batches, several requests in flight at once
+                    batches = [features[i:i + batch_size] for i in range(0, len(features), batch_size)]
                     
-                    # Convert each row to GeoJSON feature
-                    for idx, row in data.iterrows():
-                        if row.geometry is not None:
-                            feature = {
-                                "type": "Feature",
-                                "geometry": row.geometry.__geo_interface__,
-                                "properties": {}
-                            }
-                            
-                            # Add attributes (excluding geometry)
-                            for col in data.columns:
-                                if col != 'geometry':
-                                    value = row[col]
-                                    # Handle NaN and None values
-                                    if pd.isna(value):
-                                        value = None
-                                    elif isinstance(value, (pd.Timestamp, pd.DatetimeIndex)):
-                                        value = str(value)
-                                    feature["properties"][col] = value
-                            
-                            feature_collection["features"].append(feature)
-                    
-                    # Overwrite layer data
-                    # First, delete all existing features
-                    delete_result = layer.delete_features(where="1=1")
+                    success_count = 0
+                    error_count = 0
+                    batch_errors = []
                     
-                    if delete_result.get('deleteResults'):
-                        # Add new features in batches
-                        batch_size = 1000
-                        features = feature_collection["features"]
-                        
-                        success_count = 0
-                        error_count = 0
+                    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel_batches, len(batches) or 1))) as executor:
+                        futures = {executor.submit(layer.edit_features, adds=batch): batch for batch in batches}
                         
-                        for i in range(0, len(features), batch_size):
-                            batch = features[i:i + batch_size]
-                            
-                            # Create FeatureSet from batch
-                            batch_collection = {
-                                "type": "FeatureCollection",
-                                "features": batch
-                            }
+                        for future in as_completed(futures):
+                            try:
+                                add_result = future.result()
+                            except Exception as e:
+                                error_count += len(futures[future])
+                                batch_errors.append(str(e))
+                                add_result = {}
                             
-                            # Add features
-                            add_result = layer.edit_features(adds=batch_collection["features"])
-                            
-                            if add_result.get('addResults'):
-                                for result in add_result['addResults']:
-                                    if result.get('success'):
-                                        success_count += 1
-                                    else:
-                                        error_count += 1
-                            
-                            # Small delay between batches
-                            time.sleep(0.1)
-                        
-                        return {
-                            'success': True,
-                            'message': f"Successfully updated {success_count} features",
-                            'features_added': success_count,
-                            'errors': error_count
-                        }
-                    else:
+                            for result in add_result.get('addResults', []):
+                                if result.get('success'):
+                                    success_count += 1
+                                else:
+                                    error_count += 1
+                    
+                    # Feature counts in the cached layer listing are now stale
+                    self._cache.pop(('user_layers', self.username, self.portal_url), None)
+                    
+                    if error_count:
+                        # A partial overwrite is data loss; roll the layer back to the snapshot
+                        restored = self._restore_features(layer, snapshot, batch_size, original_count)
                         return {
                             'success': False,
-                            'error': "Failed to delete existing features"
+                            'error': (f"{error_count} of {len(features)} features failed to upload; "
+                                      + ("layer restored to its previous features" if restored
+                                         else "restoring the previous features also failed")),
+                            'features_added': success_count,
+                            'errors': error_count,
+                            'batch_errors': batch_errors,
+                            'restored': restored
                         }
-                        
+                    
+                    return {
+                        'success': True,
+                        'message': f"Successfully updated {success_count} features",
+                        'features_added': success_count,
+                        'errors': error_count
+                    }
+                else:
+                    return {
+                        'success': False,
+                        'error': "Failed to delete existing features"
+                    }
+                    
             except Exception as e:
                 return {
                     'success': False,
@@ -323,6 +391,73 @@ class ArcGISManager:
                 'error': f"Error updating layer: {str(e)}"
             }
     
+    def _restore_features(self, layer, snapshot: List[Dict[str, Any]], batch_size: int,
+                          original_count: int) -> bool:
+        """
+        Replace a layer's features with a snapshot taken before an overwrite
+        
+        Args:
+            layer: FeatureLayer to restore
+            snapshot: Feature dicts queried from the layer before it was cleared
+            batch_size: Number of features sent per applyEdits request
+            original_count: Feature count of the layer before it was cleared
+            
+        Returns:
+            bool: True if the layer is back to its original feature count
+        """
+        try:
+            if not layer.delete_features(where="1=1", return_delete_results=False).get('success'):
+                return False
+            for i in range(0, len(snapshot), batch_size):
+                add_result = layer.edit_features(adds=snapshot[i:i + batch_size])
+                if not all(result.get('success') for result in add_result.get('addResults', [])):
+                    return False
+            return layer.query(where="1=1", return_count_only=True) == original_count
+        except Exception:
+            return False
+    
+    def _build_features(self, data: gpd.GeoDataFrame) -> List[Dict[str, Any]]:
+        """
+        Convert a GeoDataFrame into feature dicts column-wise instead of row by row
+        
+        Args:
+            data: GeoDataFrame to convert
+            
+        Returns:
+            List of Esri JSON feature dicts (rows with null geometry are skipped)
+        """
+        geometry_column = data.geometry.name
+        valid = data[data.geometry.notna()]
+        
+        attributes = pd.DataFrame(valid.drop(columns=[geometry_column]))
+        
+        # Timestamps are sent as strings; NaN/NaT become None
+        for col in attributes.select_dtypes(include=['datetime', 'datetimetz']).columns:
+            attributes[col] = attributes[col].astype(str).where(attributes[col].notna(), None)
+        attributes = attributes.astype(object).where(attributes.notna(), None)
+        
+        records = attributes.to_dict(orient='records')
+        
+        # Resolve the spatial reference once for the whole frame
+        epsg = data.crs.to_epsg() if data.crs is not None else None
+        spatial_reference = {'wkid': epsg} if epsg else None
+        geometry_values = valid.geometry.values
+        if len(valid) and (valid.geom_type == 'Point').all():
+            # Point layers: pull x/y out of the whole geometry array at once
+            xs = shapely.get_x(geometry_values).tolist()
+            ys = shapely.get_y(geometry_values).tolist()
+            if spatial_reference:
+                geometries = [{'x': x, 'y': y, 'spatialReference': spatial_reference} for x, y in zip(xs, ys)]
+            else:
+                geometries = [{'x': x, 'y': y} for x, y in zip(xs, ys)]
+        else:
+            geometries = [shapely_to_esri_geometry(geom, spatial_reference) for geom in geometry_values]
+        
+        return [
+            {"attributes": attributes, "geometry": geometry}
+            for geometry, attributes in zip(geometries, records)
+        ]
+    
     def create_backup_item(self, layer_id: str, backup_title: str) -> Dict[str, Any]:
         """
         Create a backup copy of a feature layer
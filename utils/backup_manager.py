@@ -1,13 +1,14 @@
 import os
-import json
 import tempfile
 import shutil
 import gzip
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import streamlit as st
 import pandas as pd
 import geopandas as gpd
+from utils.json_store import write_json_atomic, read_json
 
 class BackupManager:
     """Manages backup operations for ArcGIS layers"""
@@ -15,6 +16,7 @@ class BackupManager:
     def __init__(self, backup_dir: str = "backups"):
         self.backup_dir = backup_dir
         self.metadata_file = os.path.join(backup_dir, "backup_metadata.json")
+        self._metadata_lock = threading.Lock()
         self.ensure_backup_directory()
     
     def ensure_backup_directory(self):
@@ -57,7 +59,7 @@ class BackupManager:
                 if layer_data.crs is None:
                     layer_data = layer_data.set_crs('EPSG:4326')
                 
-                layer_data.to_file(data_file)
+                layer_data.to_file(data_file, engine='pyogrio', use_arrow=True)
             else:
                 # Create empty shapefile with schema
                 self._create_empty_shapefile(data_file, layer_schema)
@@ -145,13 +147,13 @@ class BackupManager:
             gdf = gdf.set_crs('EPSG:4326')
             
             # Save as shapefile
-            gdf.to_file(file_path)
+            gdf.to_file(file_path, engine='pyogrio')
             
         except Exception as e:
             # Fallback: create minimal shapefile
             gdf = gpd.GeoDataFrame({'id': []}, geometry=[])
             gdf = gdf.set_crs('EPSG:4326')
-            gdf.to_file(file_path)
+            gdf.to_file(file_path, engine='pyogrio')
     
     def _compress_backup(self, source_folder: str, compressed_file: str):
         """Compress backup folder"""
@@ -165,17 +167,17 @@ class BackupManager:
             raise Exception(f"Error compressing backup: {str(e)}")
     
     def _save_backup_metadata(self, backup_id: str, metadata: Dict[str, Any]):
-        """Save backup metadata"""
+        """Save backup metadata (serialized, since backups may run concurrently)"""
         try:
-            # Load existing metadata
-            all_metadata = self._load_all_metadata()
-            
-            # Add new backup
-            all_metadata[backup_id] = metadata
-            
-            # Save metadata
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(all_metadata, f, indent=2, ensure_ascii=False)
+            with self._metadata_lock:
+                # Load existing metadata
+                all_metadata = self._load_all_metadata()
+                
+                # Add new backup
+                all_metadata[backup_id] = metadata
+                
+                # Save metadata
+                write_json_atomic(self.metadata_file, all_metadata)
                 
         except Exception as e:
             st.error(f"Error saving backup metadata: {str(e)}")
@@ -184,8 +186,7 @@ class BackupManager:
         """Load all backup metadata"""
         try:
             if os.path.exists(self.metadata_file):
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return read_json(self.metadata_file)
             return {}
         except Exception:
             return {}
@@ -282,7 +283,7 @@ class BackupManager:
                     }
                 
                 # Read backup data
-                backup_data = gpd.read_file(shp_file)
+                backup_data = gpd.read_file(shp_file, engine="pyogrio", use_arrow=True)
                 
                 # Restore data to layer
                 result = arcgis_manager.update_layer(layer_id, backup_data, layer_title)
@@ -327,16 +328,19 @@ class BackupManager:
             Dict containing deletion results
         """
         try:
-            # Get backup metadata
-            all_metadata = self._load_all_metadata()
-            
-            if backup_id not in all_metadata:
-                return {
-                    'success': False,
-                    'error': f"Backup {backup_id} not found"
-                }
-            
-            metadata = all_metadata[backup_id]
+            # Remove the entry under the same lock as _save_backup_metadata, so a backup
+            # finishing concurrently cannot be dropped by this read-modify-write
+            with self._metadata_lock:
+                all_metadata = self._load_all_metadata()
+                
+                if backup_id not in all_metadata:
+                    return {
+                        'success': False,
+                        'error': f"Backup {backup_id} not found"
+                    }
+                
+                metadata = all_metadata.pop(backup_id)
+                write_json_atomic(self.metadata_file, all_metadata)
             
             # Delete backup files
             if metadata.get('compressed', False):
@@ -350,13 +354,6 @@ class BackupManager:
                 if os.path.exists(backup_folder):
                     shutil.rmtree(backup_folder)
             
-            # Remove from metadata
-            del all_metadata[backup_id]
-            
-            # Save updated metadata
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(all_metadata, f, indent=2, ensure_ascii=False)
-            
             return {
                 'success': True,
                 'message': f"Backup {backup_id} deleted successfully"
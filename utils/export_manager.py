@@ -37,24 +37,31 @@ class ExportManager:
             Dict containing export data in multiple formats
         """
         try:
-            # Prepare data
-            summary_data = []
-            
-            for result in update_results:
-                summary_data.append({
-                    'Timestamp': result.get('timestamp', ''),
-                    'Layer_Title': result.get('layer_title', ''),
-                    'Layer_ID': result.get('layer_id', ''),
-                    'Source_File': result.get('filename', ''),
-                    'Status': 'SUCCESS' if result.get('success', False) else 'FAILED',
-                    'Message': result.get('message', ''),
-                    'Features_Added': result.get('features_added', ''),
-                    'Errors': result.get('errors', '')
-                })
+            # Prepare data (built column-wise in one pass)
+            results_df = pd.DataFrame.from_records(update_results).reindex(columns=[
+                'timestamp', 'layer_title', 'layer_id', 'filename', 'success',
+                'message', 'features_added', 'errors'
+            ])
+            summary_df = results_df.drop(columns=['success']).fillna('').rename(columns={
+                'timestamp': 'Timestamp',
+                'layer_title': 'Layer_Title',
+                'layer_id': 'Layer_ID',
+                'filename': 'Source_File',
+                'message': 'Message',
+                'features_added': 'Features_Added',
+                'errors': 'Errors'
+            })
+            success = results_df['success'].fillna(False).astype(bool)
+            summary_df.insert(4, 'Status', success.map({True: 'SUCCESS', False: 'FAILED'}))
+            
+            # Normalize ISO timestamps for display (cache dedupes repeated values)
+            timestamps = pd.to_datetime(results_df['timestamp'], format='ISO8601', errors='coerce', cache=True)
+            summary_df['Timestamp'] = timestamps.dt.strftime('%Y-%m-%d %H:%M:%S').fillna(summary_df['Timestamp'])
+            summary_data = summary_df.to_dict('records')
             
             # Calculate summary statistics
-            total_updates = len(update_results)
-            successful_updates = sum(1 for result in update_results if result.get('success', False))
+            total_updates = len(summary_df)
+            successful_updates = int(success.sum())
             failed_updates = total_updates - successful_updates
             success_rate = (successful_updates / total_updates * 100) if total_updates > 0 else 0
             
@@ -70,14 +77,14 @@ class ExportManager:
             export_data = {}
             
             # CSV format
-            export_data['csv'] = self._create_csv_export(summary_data, stats)
+            export_data['csv'] = self._create_csv_export(summary_df, stats)
             
             # JSON format
             export_data['json'] = self._create_json_export(summary_data, stats)
             
             # Excel format
             try:
-                export_data['xlsx'] = self._create_excel_export(summary_data, stats)
+                export_data['xlsx'] = self._create_excel_export(summary_df, stats)
             except Exception as e:
                 st.warning(f"Excel export not available: {str(e)}")
             
@@ -94,7 +101,7 @@ class ExportManager:
             st.error(f"Error creating update summary: {str(e)}")
             return {}
     
-    def _create_csv_export(self, data: List[Dict[str, Any]], stats: Dict[str, Any]) -> str:
+    def _create_csv_export(self, data: pd.DataFrame, stats: Dict[str, Any]) -> str:
         """Create CSV export"""
         try:
             output = StringIO()
@@ -112,9 +119,8 @@ class ExportManager:
             output.write("#\n")
             
             # Write data
-            if data:
-                df = pd.DataFrame(data)
-                df.to_csv(output, index=False)
+            if not data.empty:
+                data.to_csv(output, index=False)
             else:
                 output.write("No data available\n")
             
@@ -141,7 +147,7 @@ class ExportManager:
         except Exception as e:
             return json.dumps({'error': f'Error creating JSON export: {str(e)}'})
     
-    def _create_excel_export(self, data: List[Dict[str, Any]], stats: Dict[str, Any]) -> bytes:
+    def _create_excel_export(self, data: pd.DataFrame, stats: Dict[str, Any]) -> bytes:
         """Create Excel export"""
         try:
             output = BytesIO()
@@ -152,9 +158,8 @@ class ExportManager:
                 stats_df.to_excel(writer, sheet_name='Summary', index=False)
                 
                 # Detailed results sheet
-                if data:
-                    results_df = pd.DataFrame(data)
-                    results_df.to_excel(writer, sheet_name='Detailed_Results', index=False)
+                if not data.empty:
+                    data.to_excel(writer, sheet_name='Detailed_Results', index=False)
                 
                 # Metadata sheet
                 metadata = {
@@ -407,9 +412,12 @@ class ExportManager:
         try:
             exports = {}
             
-            # CSV export
-            stats_df = pd.DataFrame([layer_stats])
-            exports['csv'] = stats_df.to_csv(index=False)
+            # CSV export (a single row of known fields, so no DataFrame needed)
+            csv_output = StringIO()
+            writer = csv.writer(csv_output, lineterminator='\n')
+            writer.writerow(layer_stats.keys())
+            writer.writerow(layer_stats.values())
+            exports['csv'] = csv_output.getvalue()
             
             # JSON export
             export_data = {
@@ -487,8 +495,11 @@ class ExportManager:
             
             # Convert to CSV
             if csv_data:
-                df = pd.DataFrame(csv_data)
-                reports['csv'] = df.to_csv(index=False)
+                csv_output = StringIO()
+                writer = csv.DictWriter(csv_output, fieldnames=['Category', 'Metric', 'Value', 'Status'], lineterminator='\n')
+                writer.writeheader()
+                writer.writerows(csv_data)
+                reports['csv'] = csv_output.getvalue()
             
             return reports
             
@@ -3,15 +3,18 @@ import tempfile
 import os
 import geopandas as gpd
 import pandas as pd
-from typing import Dict, List, Any, Optional
+import pyogrio
+from typing import Dict, List, Any, Optional, Tuple
 import streamlit as st
 
 class FileHandler:
     """Handles file operations for shapefile processing"""
     
-    def __init__(self):
+    def __init__(self, max_uncompressed_mb: int = 1024):
         self.required_extensions = ['.shp', '.shx', '.dbf']
         self.optional_extensions = ['.prj', '.cpg', '.sbn', '.sbx']
+        self.extract_extensions = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+        self.max_uncompressed_bytes = max_uncompressed_mb * 1024 * 1024
     
     def validate_zip_file(self, zip_file) -> Dict[str, Any]:
         """
@@ -81,7 +84,9 @@ class FileHandler:
     
     def extract_zip_file(self, zip_file, extract_path: str) -> Dict[str, str]:
         """
-        Extract zip file and return paths to shapefile components
+        Extract the shapefile components of a zip file and return their paths.
+        Other archive members are skipped, and archives whose components exceed
+        the uncompressed size limit are rejected before anything is written.
         
         Args:
             zip_file: Uploaded zip file
@@ -92,44 +97,55 @@ class FileHandler:
         """
         try:
             with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-                zip_ref.extractall(extract_path)
+                members = [info for info in zip_ref.infolist()
+                           if not info.is_dir() and info.filename.lower().endswith(self.extract_extensions)]
                 
-                # Find shapefile components
+                total_size = sum(info.file_size for info in members)
+                if total_size > self.max_uncompressed_bytes:
+                    raise ValueError(
+                        f"Shapefile components are {total_size / (1024 * 1024):.0f} MB uncompressed, "
+                        f"exceeding the {self.max_uncompressed_bytes / (1024 * 1024):.0f} MB limit"
+                    )
+                
+                # Extract shapefile components only
                 extracted_files = {}
                 
-                for root, dirs, files in os.walk(extract_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        ext = os.path.splitext(file)[1].lower()
-                        
-                        if ext == '.shp':
-                            extracted_files['shp'] = file_path
-                        elif ext == '.shx':
-                            extracted_files['shx'] = file_path
-                        elif ext == '.dbf':
-                            extracted_files['dbf'] = file_path
-                        elif ext == '.prj':
-                            extracted_files['prj'] = file_path
-                        elif ext == '.cpg':
-                            extracted_files['cpg'] = file_path
+                for info in members:
+                    file_path = zip_ref.extract(info, extract_path)
+                    ext = os.path.splitext(info.filename)[1].lower()
+                    extracted_files[ext.lstrip('.')] = file_path
                 
                 return extracted_files
                 
         except Exception as e:
             raise Exception(f"Error extracting zip file: {str(e)}")
     
-    def read_shapefile(self, shapefile_path: str) -> gpd.GeoDataFrame:
+    def read_shapefile(self, shapefile_path: str, columns: Optional[List[str]] = None,
+                       read_geometry: bool = True, bbox: Optional[Tuple[float, float, float, float]] = None,
+                       mask: Optional[Any] = None) -> gpd.GeoDataFrame:
         """
         Read shapefile into GeoDataFrame
         
         Args:
             shapefile_path: Path to .shp file
+            columns: Attribute columns to read (None reads all, [] reads none)
+            read_geometry: Whether to read the geometry column
+            bbox: Only read features intersecting (minx, miny, maxx, maxy), in the file's CRS
+            mask: Only read features intersecting this geometry, GeoSeries or GeoDataFrame
             
         Returns:
             GeoDataFrame containing shapefile data
         """
         try:
-            gdf = gpd.read_file(shapefile_path)
+            read_kwargs = {
+                'engine': 'pyogrio',
+                'use_arrow': True,
+                'columns': columns,
+                'read_geometry': read_geometry,
+                'bbox': bbox,
+                'mask': mask
+            }
+            gdf = gpd.read_file(shapefile_path, **read_kwargs)
             
             # Handle encoding issues
             if gdf.empty:
@@ -137,7 +153,7 @@ class FileHandler:
                 encodings = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']
                 for encoding in encodings:
                     try:
-                        gdf = gpd.read_file(shapefile_path, encoding=encoding)
+                        gdf = gpd.read_file(shapefile_path, encoding=encoding, **read_kwargs)
                         if not gdf.empty:
                             break
                     except:
@@ -151,6 +167,35 @@ class FileHandler:
         except Exception as e:
             raise Exception(f"Error reading shapefile: {str(e)}")
     
+    def read_shapefile_info(self, shapefile_path: str) -> Dict[str, Any]:
+        """
+        Read shapefile metadata from the file headers without loading any rows
+        
+        Args:
+            shapefile_path: Path to .shp file
+            
+        Returns:
+            Dict containing shapefile information (same keys as get_shapefile_info)
+        """
+        try:
+            meta = pyogrio.read_info(shapefile_path)
+            fields = [str(field).strip() for field in meta['fields']]
+            
+            info = {
+                'record_count': meta['features'],
+                'fields': fields + ['geometry'],
+                'geometry_types': [meta['geometry_type']] if meta['geometry_type'] else [],
+                'crs': meta['crs'],
+                'bounds': list(meta['total_bounds']) if meta.get('total_bounds') is not None else None,
+                'has_geometry': meta['geometry_type'] is not None,
+                'field_types': dict(zip(fields, (str(dtype) for dtype in meta['dtypes'])))
+            }
+            
+            return info
+            
+        except Exception as e:
+            raise Exception(f"Error reading shapefile info: {str(e)}")
+    
     def get_shapefile_info(self, gdf: gpd.GeoDataFrame) -> Dict[str, Any]:
         """
         Extract information from GeoDataFrame
@@ -244,12 +289,11 @@ class FileHandler:
             Prepared GeoDataFrame
         """
         try:
-            # Make a copy to avoid modifying original
-            prepared_gdf = gdf.copy()
-            
-            # Reproject if needed
-            if target_crs and prepared_gdf.crs != target_crs:
-                prepared_gdf = prepared_gdf.to_crs(target_crs)
+            # Reproject if needed; to_crs already returns a new frame, so only copy otherwise
+            if target_crs and (gdf.crs is None or not gdf.crs.equals(target_crs, ignore_axis_order=True)):
+                prepared_gdf = gdf.to_crs(target_crs)
+            else:
+                prepared_gdf = gdf.copy()
             
             # Clean invalid geometries
             if 'geometry' in prepared_gdf.columns:
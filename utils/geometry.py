@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+def sdf_to_geodataframe(df: pd.DataFrame, geometry_column: str = 'SHAPE'):
+    """
+    Convert a query result DataFrame (FeatureSet.sdf) to a GeoDataFrame without a WKT round-trip
+
+    Args:
+        df: Spatially enabled DataFrame whose geometry column holds arcgis Geometry objects
+        geometry_column: Name of the geometry column
+
+    Returns:
+        GeoDataFrame with shapely geometries and the layer's CRS (None if unknown)
+    """
+    import geopandas as gpd
+
+    # Geometry.WKT is itself produced from the shapely geometry, so take that geometry
+    # directly instead of serializing to WKT and parsing it back
+    geometries = np.array(
+        [geom.as_shapely if geom is not None else None for geom in df[geometry_column]],
+        dtype=object
+    )
+
+    crs = None
+    try:
+        spatial_reference = df.spatial.sr
+        crs = spatial_reference.get('latestWkid') or spatial_reference.get('wkid')
+    except Exception:
+        pass
+
+    return gpd.GeoDataFrame(
+        df.assign(**{geometry_column: geometries}),
+        geometry=geometry_column,
+        crs=crs
+    )
@@ -0,0 +1,36 @@
+import os
+import tempfile
+from typing import Any
+import orjson
+
+def write_json_atomic(path: str, data: Any):
+    """
+    Write JSON to a unique temporary file, flush it to disk and rename it over the target
+
+    Readers never see a half-written file, and concurrent writers never share a temp file.
+
+    Args:
+        path: Destination JSON file
+        data: JSON-serializable object
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        try:
+            f = os.fdopen(fd, 'wb')
+        except BaseException:
+            # fdopen didn't take ownership of the descriptor, so close it here
+            os.close(fd)
+            raise
+        with f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_json(path: str) -> Any:
+    """Read a JSON file"""
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
@@ -1,14 +1,21 @@
 import logging
 import os
+import json
+from collections import deque
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import streamlit as st
 
 class Logger:
     """Handles logging operations for the application"""
     
-    def __init__(self, log_file: str = "update_log.txt"):
+    def __init__(self, log_file: str = "update_log.txt", history_file: str = "update_history.jsonl",
+                 history_window: int = 500, history_max_bytes: int = 5 * 1024 * 1024):
         self.log_file = log_file
+        self.history_file = history_file
+        self.history_window = history_window
+        self.history_max_bytes = history_max_bytes
+        self._recent_updates = None  # deque of the newest history records, loaded lazily
         self.setup_logging()
     
     def setup_logging(self):
@@ -87,9 +94,86 @@ class Logger:
             level = 'info' if success else 'error'
             self.log(level, message, user)
             
+            self._record_update({
+                'timestamp': datetime.now().isoformat(),
+                'operation': operation_type,
+                'layer_id': layer_id,
+                'layer_title': layer_title,
+                'success': success,
+                'details': details,
+                'user': user
+            })
+            
         except Exception as e:
             self.log('error', f"Error logging update operation: {str(e)}")
     
+    def _record_update(self, record: Dict[str, Any]):
+        """Append an update record to the on-disk history and the in-memory window"""
+        # Seed the window before writing, or seeding would read this record back from disk too
+        window = self._get_recent_updates()
+        
+        # Cap the history file: once it passes history_max_bytes it is rotated to
+        # <history_file>.1 (replacing the previous rotation) and a fresh file is started
+        if os.path.exists(self.history_file) and os.path.getsize(self.history_file) >= self.history_max_bytes:
+            os.replace(self.history_file, f"{self.history_file}.1")
+        
+        with open(self.history_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        
+        window.append(record)
+    
+    def _get_recent_updates(self) -> deque:
+        """Return the sliding window of recent update records, seeding it from disk once"""
+        if self._recent_updates is None:
+            self._recent_updates = deque(maxlen=self.history_window)
+            for line in self._read_history_tail(self.history_window):
+                try:
+                    self._recent_updates.append(json.loads(line))
+                except ValueError:
+                    continue
+        return self._recent_updates
+    
+    def _read_history_tail(self, n: int) -> deque:
+        """Last n history lines across the rotated file and the current one, oldest first"""
+        lines = deque(maxlen=n)
+        for path in (f"{self.history_file}.1", self.history_file):
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines.extend(f)
+        return lines
+    
+    def get_update_history(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Get update history records, newest first
+        
+        Args:
+            limit: Maximum number of records to return
+            offset: Number of newest records to skip (for paging into older history)
+            
+        Returns:
+            List of update history records
+        """
+        try:
+            recent = self._get_recent_updates()
+            if offset + limit <= len(recent):
+                newest_first = list(reversed(recent))
+                return newest_first[offset:offset + limit]
+            
+            # Older pages are read from disk; only offset + limit lines are kept in memory
+            lines = self._read_history_tail(offset + limit)
+            
+            records = []
+            for line in reversed(lines):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+            return records[offset:offset + limit]
+            
+        except Exception as e:
+            self.log('error', f"Error reading update history: {str(e)}")
+            return []
+    
     def log_file_operation(self, filename: str, operation: str, success: bool, 
                           details: str = None, user: str = None):
         """
@@ -137,6 +221,40 @@ class Logger:
         except Exception as e:
             self.log('error', f"Error logging authentication: {str(e)}")
     
+    def tail(self, n: int = 500, level: str = None, block_size: int = 64 * 1024) -> List[str]:
+        """
+        Read the last lines of the log file without reading the whole file
+        
+        Args:
+            n: Maximum number of lines to return
+            level: Filter by log level (optional, applied to the last n lines)
+            block_size: Bytes read per backwards seek
+            
+        Returns:
+            List of log lines (oldest first)
+        """
+        if not os.path.exists(self.log_file):
+            return []
+        
+        with open(self.log_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b''
+            
+            # Read backwards until we have n complete lines or hit the start of the file
+            while position > 0 and data.count(b'\n') <= n:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+        
+        recent_lines = data.decode('utf-8', errors='replace').splitlines()[-n:]
+        
+        if level:
+            return [line.strip() for line in recent_lines if f" - {level.upper()} - " in line]
+        
+        return [line.strip() for line in recent_lines]
+    
     def get_logs(self, level: str = None, lines: int = 100) -> List[str]:
         """
         Get recent log entries
@@ -152,21 +270,8 @@ class Logger:
             if not os.path.exists(self.log_file):
                 return ["No logs available"]
             
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-            
-            # Get last N lines
-            recent_lines = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            
-            # Filter by level if specified
-            if level:
-                filtered_lines = []
-                for line in recent_lines:
-                    if f" - {level.upper()} - " in line:
-                        filtered_lines.append(line.strip())
-                return filtered_lines
-            
-            return [line.strip() for line in recent_lines]
+            # Get last N lines (filtered by level if specified)
+            return self.tail(lines, level)
             
         except Exception as e:
             return [f"Error reading logs: {str(e)}"]
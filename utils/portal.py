@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+@st.cache_resource(ttl=300, show_spinner=False)
+def search_user_items(username, item_type, _gis):
+    """Search the user's portal items (cached per user and type; call .clear() to refresh)"""
+    return _gis.content.search(
+        query=f"owner:{username}",
+        item_type=item_type,
+        max_items=100
+    )
+
+def wait_for_item_indexed(gis, item_id, timeout=3.0, interval=0.5):
+    """Poll the portal search index for a new item; returns as soon as it is found or after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        if gis.content.search(query=f"id:{item_id}", max_items=1):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+def query_feature_pages(feature_layer, page_size=2000, max_workers=4):
+    """Query every feature a page at a time (respecting maxRecordCount), fetching pages in parallel"""
+    total = feature_layer.query(return_count_only=True)
+    if not total:
+        return []
+    
+    max_record_count = feature_layer.properties.get('maxRecordCount') or page_size
+    page_size = max(1, min(page_size, max_record_count))
+    object_id_field = feature_layer.properties.get('objectIdField') or 'OBJECTID'
+    
+    def fetch_page(offset):
+        return feature_layer.query(
+            out_fields="*",
+            order_by_fields=object_id_field,
+            result_offset=offset,
+            result_record_count=page_size
+        )
+    
+    offsets = range(0, total, page_size)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(offsets)))) as executor:
+        return [page for page in executor.map(fetch_page, offsets) if page.features]
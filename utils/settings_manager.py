@@ -1,9 +1,12 @@
 import json
 import os
+import hashlib
 from typing import Dict, Any, Optional
 import streamlit as st
 from cryptography.fernet import Fernet
 import base64
+import orjson
+from utils.json_store import write_json_atomic, read_json
 
 class SettingsManager:
     """Manages user settings and secure storage"""
@@ -12,6 +15,8 @@ class SettingsManager:
         self.settings_file = settings_file
         self.encrypted_fields = ['api_key', 'email_password']
         self._encryption_key = None
+        self._settings_cache = None  # (file mtime, file size, decrypted settings)
+        self._saved_digest = None  # (file mtime, file size, digest of the settings last written)
     
     def _get_encryption_key(self) -> bytes:
         """Get or generate encryption key"""
@@ -61,6 +66,24 @@ class SettingsManager:
             # If decryption fails, return original value (might be unencrypted)
             return encrypted_value
     
+    def _settings_digest(self, settings: Dict[str, Any]) -> str:
+        """Stable digest of a settings dict, independent of key order"""
+        serialized = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.blake2b(serialized.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _is_unchanged(self, settings: Dict[str, Any]) -> bool:
+        """Check whether settings match what is currently on disk"""
+        if not os.path.exists(self.settings_file):
+            return False
+        file_stat = os.stat(self.settings_file)
+        file_key = (file_stat.st_mtime_ns, file_stat.st_size)
+        
+        if self._settings_cache and self._settings_cache[:2] == file_key:
+            return self._settings_cache[2] == settings
+        if self._saved_digest and self._saved_digest[:2] == file_key:
+            return self._saved_digest[2] == self._settings_digest(settings)
+        return False
+    
     def save_settings(self, settings: Dict[str, Any]) -> bool:
         """
         Save user settings to file
@@ -72,6 +95,10 @@ class SettingsManager:
             bool: True if successful
         """
         try:
+            # Skip the write entirely when nothing has changed
+            if self._is_unchanged(settings):
+                return True
+            
             # Create a copy of settings for encryption
             settings_to_save = settings.copy()
             
@@ -88,9 +115,13 @@ class SettingsManager:
                 'encrypted_fields': self.encrypted_fields
             }
             
-            # Save to file
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(settings_to_save, f, indent=2, ensure_ascii=False)
+            # Save to file atomically so a crash mid-write cannot truncate it
+            write_json_atomic(self.settings_file, settings_to_save)
+            
+            # Force the next load to re-read the file, but remember what was written
+            self._settings_cache = None
+            file_stat = os.stat(self.settings_file)
+            self._saved_digest = (file_stat.st_mtime_ns, file_stat.st_size, self._settings_digest(settings))
             
             return True
             
@@ -109,8 +140,12 @@ class SettingsManager:
             if not os.path.exists(self.settings_file):
                 return self._get_default_settings()
             
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            # Reuse the parsed settings while the file is unchanged
+            file_stat = os.stat(self.settings_file)
+            if self._settings_cache and self._settings_cache[:2] == (file_stat.st_mtime_ns, file_stat.st_size):
+                return self._settings_cache[2].copy()
+            
+            settings = read_json(self.settings_file)
             
             # Decrypt sensitive fields
             encrypted_fields = settings.get('_metadata', {}).get('encrypted_fields', self.encrypted_fields)
@@ -128,7 +163,8 @@ class SettingsManager:
                 if key not in settings:
                     settings[key] = value
             
-            return settings
+            self._settings_cache = (file_stat.st_mtime_ns, file_stat.st_size, settings)
+            return settings.copy()
             
         except Exception as e:
             st.error(f"Error loading settings: {str(e)}")
@@ -180,6 +216,25 @@ class SettingsManager:
             st.error(f"Error updating setting {key}: {str(e)}")
             return False
     
+    def update_settings(self, updates: Dict[str, Any]) -> bool:
+        """
+        Update several settings with a single write
+        
+        Args:
+            updates: Dictionary of setting keys and new values
+            
+        Returns:
+            bool: True if successful
+        """
+        try:
+            current_settings = self.load_settings()
+            current_settings.update(updates)
+            return self.save_settings(current_settings)
+            
+        except Exception as e:
+            st.error(f"Error updating settings: {str(e)}")
+            return False
+    
     def get_setting(self, key: str, default: Any = None) -> Any:
         """
         Get a single setting value
@@ -234,7 +289,7 @@ class SettingsManager:
                         settings_copy[field] = '[REDACTED]'
                 settings = settings_copy
             
-            return json.dumps(settings, indent=2, ensure_ascii=False)
+            return orjson.dumps(settings, option=orjson.OPT_INDENT_2).decode()
             
         except Exception as e:
             return f"Error exporting settings: {str(e)}"
@@ -250,7 +305,7 @@ class SettingsManager:
             bool: True if successful
         """
         try:
-            imported_settings = json.loads(settings_json)
+            imported_settings = orjson.loads(settings_json)
             
             # Validate settings
             if not isinstance(imported_settings, dict):
@@ -284,8 +339,7 @@ class SettingsManager:
             
             settings = self.load_settings()
             
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, indent=2, ensure_ascii=False)
+            write_json_atomic(backup_file, settings)
             
             return True
             
@@ -307,8 +361,7 @@ class SettingsManager:
             if not os.path.exists(backup_file):
                 raise FileNotFoundError(f"Backup file not found: {backup_file}")
             
-            with open(backup_file, 'r', encoding='utf-8') as f:
-                backup_settings = json.load(f)
+            backup_settings = read_json(backup_file)
             
             return self.save_settings(backup_settings)
             
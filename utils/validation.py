@@ -4,6 +4,16 @@ from typing import Dict, List, Any, Optional
 import pyproj
 from pyproj import CRS, Transformer
 import warnings
+import os
+from functools import lru_cache
+
+# Below this many features a single-threaded to_crs is faster than partitioning
+PARALLEL_TRANSFORM_THRESHOLD = 200_000
+
+@lru_cache(maxsize=64)
+def _epsg_for_wkt(crs_wkt: str) -> Optional[int]:
+    """EPSG code for a CRS given as WKT, or None if it has no EPSG equivalent"""
+    return CRS.from_wkt(crs_wkt).to_epsg()
 
 class Validator:
     """Handles validation operations for shapefiles and schemas"""
@@ -86,6 +96,25 @@ class Validator:
             validation_results['errors'].append(f"Geometry validation error: {str(e)}")
             return validation_results
     
+    def _get_epsg(self, gdf: gpd.GeoDataFrame, crs_string: str) -> Optional[int]:
+        """
+        Get the EPSG code for a GeoDataFrame's CRS
+        
+        to_epsg() can fall back to a pyproj database search for custom WKT, so the
+        lookup is memoized per CRS in _epsg_for_wkt.
+        
+        Args:
+            gdf: GeoDataFrame with a CRS set
+            crs_string: The CRS's to_string() value
+            
+        Returns:
+            EPSG code, or None if the CRS has no EPSG equivalent
+        """
+        # Authority strings carry the code directly
+        if crs_string.upper().startswith('EPSG:') and crs_string[5:].isdigit():
+            return int(crs_string[5:])
+        return _epsg_for_wkt(gdf.crs.to_wkt())
+    
     def validate_coordinate_system(self, gdf: gpd.GeoDataFrame) -> Dict[str, Any]:
         """
         Validate and analyze coordinate reference system
@@ -125,9 +154,10 @@ class Validator:
                     crs_info['units'] = units
                 
                 # Provide recommendations
-                if gdf.crs.to_epsg() == 4326:
+                epsg = self._get_epsg(gdf, crs_info['crs_string'])
+                if epsg == 4326:
                     crs_info['recommendations'].append("WGS84 - Good for web mapping")
-                elif gdf.crs.to_epsg() == 3857:
+                elif epsg == 3857:
                     crs_info['recommendations'].append("Web Mercator - Optimized for web mapping")
                 elif crs_info['is_geographic']:
                     crs_info['recommendations'].append("Consider reprojecting to Web Mercator (EPSG:3857) for web mapping")
@@ -256,12 +286,22 @@ class Validator:
             if gdf.crs is None:
                 gdf = gdf.set_crs('EPSG:4326')
             
-            # Transform if different from target
-            if gdf.crs.to_string() != target_crs:
-                transformed_gdf = gdf.to_crs(target_crs)
-                return transformed_gdf
-            else:
+            # Transform only if the CRS actually differs (aliases such as ESRI WGS84 compare equal)
+            target = CRS.from_user_input(target_crs)
+            if gdf.crs.equals(target, ignore_axis_order=True):
                 return gdf.copy()
+            
+            # Very large frames are reprojected partition by partition across cores when the
+            # optional dask-geopandas extra is installed (imported here, it is slow to load)
+            if len(gdf) > PARALLEL_TRANSFORM_THRESHOLD:
+                try:
+                    import dask_geopandas
+                except ImportError:
+                    dask_geopandas = None
+                if dask_geopandas is not None:
+                    partitioned = dask_geopandas.from_geopandas(gdf, npartitions=os.cpu_count() or 1)
+                    return partitioned.to_crs(target).compute()
+            return gdf.to_crs(target)
                 
         except Exception as e:
             raise Exception(f"Error transforming coordinate system: {str(e)}")